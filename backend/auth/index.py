@@ -1,9 +1,15 @@
 import json
 import os
 import psycopg2
-import bcrypt
 from typing import Dict, Any
 
+from db import get_pool
+from passwords import Overloaded, hash_password, needs_rehash, verify_password
+from profiles import profile_cache
+from session import AuthError, authenticate, bearer_token, decode_token, issue_token, revoke
+
+UPDATABLE_PROFILE_FIELDS = ('full_name', 'avatar_url', 'bio')
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Authentication system with registration validation and age/terms confirmation
@@ -18,7 +24,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -37,7 +43,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         body_data = json.loads(event.get('body', '{}'))
         action = body_data.get('action', '')
         
-        conn = psycopg2.connect(database_url)
+        pool = get_pool(database_url)
+        conn = pool.getconn()
         try:
             with conn.cursor() as cur:
                 if action == 'register':
@@ -84,7 +91,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Пароль должен содержать заглавные и строчные буквы, а также цифры'})
                         }
                     
-                    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                    password_hash = hash_password(password)
                     
                     try:
                         cur.execute("""
@@ -105,7 +112,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                 'email': user[1],
                                 'username': user[2],
                                 'full_name': user[3],
-                                'created_at': user[4].isoformat() if user[4] else None
+                                'created_at': user[4].isoformat() if user[4] else None,
+                                'token': issue_token(user[0])
                             })
                         }
                     except psycopg2.IntegrityError:
@@ -117,6 +125,26 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Email или username уже используется'})
                         }
                 
+                if action == 'logout':
+                    token = bearer_token(event)
+                    if not token:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Authorization token is required'})
+                        }
+                    
+                    revoke(decode_token(token), conn)
+                    conn.commit()
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True})
+                    }
+                
                 if action == 'login':
                     email = body_data.get('email', '')
                     password = body_data.get('password', '')
@@ -140,7 +168,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Неверный email или пароль'})
                         }
                     
-                    if not bcrypt.checkpw(password.encode('utf-8'), user[3].encode('utf-8')):
+                    if not verify_password(password, user[3]):
                         return {
                             'statusCode': 401,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -148,6 +176,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Неверный email или пароль'})
                         }
                     
+                    if needs_rehash(user[3]):
+                        try:
+                            cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (hash_password(password), user[0]))
+                            conn.commit()
+                        except Overloaded:
+                            pass
+                    
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -158,16 +193,92 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'username': user[2],
                             'full_name': user[4],
                             'avatar_url': user[5],
-                            'bio': user[6]
+                            'bio': user[6],
+                            'token': issue_token(user[0])
                         })
                     }
+        except AuthError as e:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': str(e)})
+            }
+        except Overloaded:
+            return {
+                'statusCode': 429,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Слишком много запросов, попробуйте позже'})
+            }
+        finally:
+            pool.putconn(conn)
+    
+    if method == 'PUT':
+        body_data = json.loads(event.get('body', '{}'))
+        action = body_data.get('action', 'update_profile')
+        
+        pool = get_pool(database_url)
+        conn = pool.getconn()
+        try:
+            user_id = authenticate(event, conn)
+            if action == 'update_profile':
+                if not user_id:
+                    return {
+                        'statusCode': 401,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Authentication required'})
+                    }
+                
+                changes = {k: body_data[k] for k in UPDATABLE_PROFILE_FIELDS if k in body_data}
+                
+                if not changes:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'At least one of full_name, avatar_url, bio is required'})
+                    }
+                
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE users SET {} WHERE id = %s RETURNING id".format(', '.join('%s = %%s' % k for k in changes)),
+                        tuple(changes.values()) + (user_id,)
+                    )
+                    updated = cur.fetchone()
+                    conn.commit()
+                    
+                    if not updated:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'User not found'})
+                        }
+                    
+                    profile_cache.invalidate(updated[0])
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps(profile_cache.get(updated[0], cur))
+                    }
+        except AuthError as e:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': str(e)})
+            }
         finally:
-            conn.close()
+            pool.putconn(conn)
     
     if method == 'GET':
         user_id = event.get('queryStringParameters', {}).get('user_id')
         
-        if not user_id:
+        if not user_id or not str(user_id).isdigit():
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -175,11 +286,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'user_id is required'})
             }
         
-        conn = psycopg2.connect(database_url)
+        pool = get_pool(database_url)
+        conn = pool.getconn()
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, email, username, full_name, avatar_url, bio, created_at FROM users WHERE id = %s", (user_id,))
-                user = cur.fetchone()
+                user = profile_cache.get(user_id, cur)
                 
                 if not user:
                     return {
@@ -193,18 +304,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'id': user[0],
-                        'email': user[1],
-                        'username': user[2],
-                        'full_name': user[3],
-                        'avatar_url': user[4],
-                        'bio': user[5],
-                        'created_at': user[6].isoformat() if user[6] else None
-                    })
+                    'body': json.dumps(user)
                 }
         finally:
-            conn.close()
+            pool.putconn(conn)
     
     return {
         'statusCode': 405,
@@ -0,0 +1,65 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+HASH_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '2'))
+MAX_PENDING_HASHES = int(os.environ.get('BCRYPT_MAX_PENDING', '8'))
+HASH_TIMEOUT = float(os.environ.get('BCRYPT_TIMEOUT', '10'))
+
+
+class Overloaded(Exception):
+    '''Raised when too many hashes are in flight or one outlives HASH_TIMEOUT; the caller should answer 429'''
+
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(MAX_PENDING_HASHES)
+
+
+def _run(fn: Callable[..., Any], *args: Any) -> Any:
+    if not _slots.acquire(blocking=False):
+        raise Overloaded('Too many concurrent password operations')
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        raise Overloaded('Password operation timed out')
+
+
+def hash_password(password: str) -> str:
+    '''
+    Business: Hashes a password with the configured bcrypt cost on the worker pool
+    Args: password - plain text password
+    Returns: bcrypt hash string; raises Overloaded when the pool is saturated or times out
+    '''
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    '''
+    Business: Checks a password against a stored bcrypt hash on the worker pool
+    Args: password - plain text password; password_hash - stored hash
+    Returns: True on match; raises Overloaded when the pool is saturated or times out
+    '''
+    return _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def needs_rehash(password_hash: str) -> bool:
+    '''
+    Business: Detects hashes created with a cost other than BCRYPT_ROUNDS
+    Args: password_hash - stored hash like $2b$12$...
+    Returns: True when the hash should be regenerated after a successful login
+    '''
+    try:
+        return int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional, Set
+
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(30 * 24 * 3600)))
+DENYLIST_TTL = float(os.environ.get('SESSION_DENYLIST_TTL', '30'))
+REQUIRE_AUTH = os.environ.get('REQUIRE_AUTH', '') == '1'
+
+
+class AuthError(Exception):
+    '''Raised when a request carries a bad token, or none while REQUIRE_AUTH=1'''
+
+
+_revoked: Set[str] = set()
+_revoked_loaded_at = 0.0
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    secret = os.environ.get('SESSION_SECRET', '')
+    if not secret:
+        raise AuthError('Session secret is not configured')
+    return _b64encode(hmac.new(secret.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int, ttl: int = SESSION_TTL) -> Optional[str]:
+    '''
+    Business: Issues a signed stateless session token
+    Args: user_id - authenticated user; ttl - lifetime in seconds
+    Returns: Token "<payload>.<signature>", or None when SESSION_SECRET is not set
+    '''
+    if not os.environ.get('SESSION_SECRET'):
+        return None
+    payload = _b64encode(json.dumps({
+        'uid': int(user_id),
+        'exp': int(time.time()) + ttl,
+        'jti': secrets.token_hex(8)
+    }, separators=(',', ':')).encode('utf-8'))
+    return payload + '.' + _sign(payload)
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    '''
+    Business: Checks signature and expiry of a token without touching the database
+    Args: token - value produced by issue_token
+    Returns: Claims dict with uid, exp and jti; raises AuthError when invalid or expired
+    '''
+    try:
+        payload, signature = token.split('.', 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise AuthError('Invalid token')
+        claims = json.loads(_b64decode(payload))
+        if int(claims['exp']) < time.time():
+            raise AuthError('Token expired')
+        return claims
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise AuthError('Invalid token') from e
+
+
+def _refresh_denylist(conn: Any) -> None:
+    global _revoked, _revoked_loaded_at
+    with conn.cursor() as cur:
+        cur.execute("SELECT jti FROM revoked_tokens WHERE expires_at > CURRENT_TIMESTAMP")
+        _revoked = {r[0] for r in cur.fetchall()}
+    _revoked_loaded_at = time.monotonic()
+
+
+def is_revoked(jti: str, conn: Any) -> bool:
+    '''
+    Business: Looks a token id up in the deny-list, reloading it at most every DENYLIST_TTL seconds
+    Args: jti - token id; conn - pooled connection used only when the cache is stale
+    Returns: True when the token was revoked
+    '''
+    if time.monotonic() - _revoked_loaded_at > DENYLIST_TTL:
+        _refresh_denylist(conn)
+    return jti in _revoked
+
+
+def revoke(claims: Dict[str, Any], conn: Any) -> None:
+    '''
+    Business: Adds a token to the deny-list until its natural expiry
+    Args: claims - decoded token claims; conn - pooled connection (caller commits)
+    '''
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO revoked_tokens (jti, user_id, expires_at)
+            VALUES (%s, %s, to_timestamp(%s))
+            ON CONFLICT (jti) DO NOTHING
+        """, (claims['jti'], claims['uid'], claims['exp']))
+    _revoked.add(claims['jti'])
+
+
+def bearer_token(event: Dict[str, Any]) -> Optional[str]:
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    value = headers.get('authorization') or ''
+    if value.lower().startswith('bearer '):
+        return value[7:].strip() or None
+    return headers.get('x-auth-token') or None
+
+
+def authenticate(event: Dict[str, Any], conn: Any) -> Optional[int]:
+    '''
+    Business: Resolves the caller from the Authorization: Bearer (or X-Auth-Token) header
+    Args: event - HTTP event; conn - pooled connection for the deny-list refresh
+    Returns: User id from a valid token, or None for anonymous requests when REQUIRE_AUTH is off;
+             raises AuthError for bad, expired or revoked tokens
+    '''
+    token = bearer_token(event)
+    if not token:
+        if REQUIRE_AUTH:
+            raise AuthError('Authentication required')
+        return None
+    claims = decode_token(token)
+    if is_revoked(claims['jti'], conn):
+        raise AuthError('Token revoked')
+    return int(claims['uid'])
@@ -3,6 +3,92 @@ import os
 import psycopg2
 from typing import Dict, Any
 
+from db import get_pool
+from profiles import profile_cache
+from session import AuthError, authenticate
+
+TIMELINE_BACKFILL = 50
+TIMELINE_LENGTH = 500
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_SUGGESTIONS = 100
+MAX_STATUS_IDS = 100
+PRIVATE_REQUEST_TYPES = ('status', 'suggestions', 'pending')
+
+TRIM_TIMELINES_QUERY = """
+    DELETE FROM home_timeline t
+    USING (
+        SELECT u.user_id, b.created_at, b.post_id
+        FROM unnest(%s::int[]) AS u(user_id)
+        CROSS JOIN LATERAL (
+            SELECT h.created_at, h.post_id
+            FROM home_timeline h
+            WHERE h.user_id = u.user_id
+            ORDER BY h.created_at DESC, h.post_id DESC
+            OFFSET {keep} LIMIT 1
+        ) b
+    ) cutoff
+    WHERE t.user_id = cutoff.user_id AND (t.created_at, t.post_id) <= (cutoff.created_at, cutoff.post_id)
+""".format(keep=TIMELINE_LENGTH)
+
+FRIEND_OF_FRIEND_PATHS = """
+    SELECT %(a)s AS user_id, f.friend_id AS candidate_id FROM friends f
+    WHERE f.user_id = %(b)s AND f.status = 'accepted' AND f.friend_id <> %(a)s
+    UNION ALL
+    SELECT f.friend_id, %(a)s FROM friends f
+    WHERE f.user_id = %(b)s AND f.status = 'accepted' AND f.friend_id <> %(a)s
+    UNION ALL
+    SELECT %(b)s, f.friend_id FROM friends f
+    WHERE f.user_id = %(a)s AND f.status = 'accepted' AND f.friend_id <> %(b)s
+    UNION ALL
+    SELECT f.friend_id, %(b)s FROM friends f
+    WHERE f.user_id = %(a)s AND f.status = 'accepted' AND f.friend_id <> %(b)s
+"""
+
+SUGGESTIONS_QUERY = """
+    SELECT fof.candidate_id, fof.mutual_count
+    FROM friend_of_friend fof
+    WHERE fof.user_id = %s
+      AND NOT EXISTS (SELECT 1 FROM friends f WHERE f.user_id = fof.user_id AND f.friend_id = fof.candidate_id)
+      AND NOT EXISTS (SELECT 1 FROM friends f WHERE f.user_id = fof.candidate_id AND f.friend_id = fof.user_id)
+    ORDER BY fof.mutual_count DESC, fof.candidate_id
+    LIMIT %s
+"""
+
+MUTUAL_FRIENDS_QUERY = """
+    SELECT a.friend_id
+    FROM friends a
+    JOIN friends b ON b.user_id = %s AND b.friend_id = a.friend_id AND b.status = 'accepted'
+    WHERE a.user_id = %s AND a.status = 'accepted' AND a.friend_id > %s
+    ORDER BY a.friend_id
+    LIMIT %s
+"""
+
+def update_friend_of_friend(cur: Any, a: Any, b: Any, delta: int) -> None:
+    '''
+    Business: Applies the two-hop paths created (delta=1) or destroyed (delta=-1) by the friendship a-b
+    Args: cur - cursor inside the accept/remove transaction; a, b - the two users; delta - +1 or -1
+    Returns: None; pairs left without mutual friends are deleted. Both users' rows stay locked until commit,
+             so concurrent changes sharing a user run one after another and each sees the other's edges
+    '''
+    cur.execute("SELECT id FROM users WHERE id IN (%s, %s) ORDER BY id FOR UPDATE", (int(a), int(b)))
+    cur.execute("""
+        INSERT INTO friend_of_friend (user_id, candidate_id, mutual_count)
+        SELECT user_id, candidate_id, COUNT(*) * %(delta)s
+        FROM ({}) paths
+        GROUP BY user_id, candidate_id
+        ON CONFLICT (user_id, candidate_id) DO UPDATE
+        SET mutual_count = friend_of_friend.mutual_count + EXCLUDED.mutual_count
+        RETURNING user_id, candidate_id, mutual_count
+    """.format(FRIEND_OF_FRIEND_PATHS), {'a': int(a), 'b': int(b), 'delta': delta})
+    
+    emptied = [r for r in cur.fetchall() if r[2] <= 0]
+    if emptied:
+        cur.execute("""
+            DELETE FROM friend_of_friend
+            WHERE (user_id, candidate_id) IN (SELECT * FROM unnest(%s::int[], %s::int[]))
+        """, ([r[0] for r in emptied], [r[1] for r in emptied]))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Friends system with requests and status management
@@ -17,7 +103,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,13 +118,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Database configuration error'})
         }
     
-    conn = psycopg2.connect(database_url)
+    pool = get_pool(database_url)
+    conn = pool.getconn()
     try:
+        session_user_id = authenticate(event, conn)
         with conn.cursor() as cur:
             if method == 'POST':
                 body_data = json.loads(event.get('body', '{}'))
                 action = body_data.get('action', '')
-                user_id = body_data.get('user_id')
+                user_id = session_user_id or body_data.get('user_id')
                 friend_id = body_data.get('friend_id')
                 
                 if not user_id or not friend_id:
@@ -49,6 +137,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'user_id and friend_id are required'})
                     }
                 
+                if str(user_id) == str(friend_id):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'user_id and friend_id must differ'})
+                    }
+                
                 if action == 'send_request':
                     try:
                         cur.execute("""
@@ -78,14 +174,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         UPDATE friends 
                         SET status = 'accepted'
                         WHERE friend_id = %s AND user_id = %s AND status = 'pending'
+                        RETURNING id
                     """, (user_id, friend_id))
                     
+                    if not cur.fetchone():
+                        conn.rollback()
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Request not found'})
+                        }
+                    
                     cur.execute("""
                         INSERT INTO friends (user_id, friend_id, status)
                         VALUES (%s, %s, 'accepted')
-                        ON CONFLICT (user_id, friend_id) DO NOTHING
+                        ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'accepted'
                     """, (user_id, friend_id))
                     
+                    update_friend_of_friend(cur, user_id, friend_id, 1)
+                    
+                    cur.execute("""
+                        INSERT INTO home_timeline (user_id, post_id, author_id, created_at)
+                        (SELECT %s, p.id, p.user_id, p.created_at FROM posts p
+                         WHERE p.user_id = %s ORDER BY p.created_at DESC, p.id DESC LIMIT %s)
+                        UNION ALL
+                        (SELECT %s, p.id, p.user_id, p.created_at FROM posts p
+                         WHERE p.user_id = %s ORDER BY p.created_at DESC, p.id DESC LIMIT %s)
+                        ON CONFLICT (user_id, post_id) DO NOTHING
+                    """, (user_id, friend_id, TIMELINE_BACKFILL, friend_id, user_id, TIMELINE_BACKFILL))
+                    cur.execute(TRIM_TIMELINES_QUERY, ([int(user_id), int(friend_id)],))
+                    
                     conn.commit()
                     
                     return {
@@ -113,6 +232,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     cur.execute("""
                         DELETE FROM friends
                         WHERE (user_id = %s AND friend_id = %s) OR (user_id = %s AND friend_id = %s)
+                        RETURNING status
+                    """, (user_id, friend_id, friend_id, user_id))
+                    
+                    if any(r[0] == 'accepted' for r in cur.fetchall()):
+                        update_friend_of_friend(cur, user_id, friend_id, -1)
+                    
+                    cur.execute("""
+                        DELETE FROM home_timeline
+                        WHERE (user_id = %s AND author_id = %s) OR (user_id = %s AND author_id = %s)
                     """, (user_id, friend_id, friend_id, user_id))
                     conn.commit()
                     
@@ -125,8 +253,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if method == 'GET':
                 params = event.get('queryStringParameters', {})
-                user_id = params.get('user_id')
                 request_type = params.get('type', 'friends')
+                if request_type in PRIVATE_REQUEST_TYPES:
+                    user_id = session_user_id or params.get('user_id')
+                else:
+                    user_id = params.get('user_id') or session_user_id
                 
                 if not user_id:
                     return {
@@ -136,16 +267,120 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'user_id is required'})
                     }
                 
+                if request_type == 'status':
+                    try:
+                        ids = [int(i) for i in (params.get('ids') or '').split(',') if i.strip()]
+                    except ValueError:
+                        ids = []
+                    
+                    if not ids or len(ids) > MAX_STATUS_IDS:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'ids must be a comma-separated list of 1 to %d user ids' % MAX_STATUS_IDS})
+                        }
+                    
+                    cur.execute("""
+                        SELECT f.friend_id, f.status, true FROM friends f
+                        WHERE f.user_id = %s AND f.friend_id = ANY(%s)
+                        UNION ALL
+                        SELECT f.user_id, f.status, false FROM friends f
+                        WHERE f.user_id = ANY(%s) AND f.friend_id = %s
+                    """, (user_id, ids, ids, user_id))
+                    
+                    statuses = {i: 'none' for i in ids}
+                    for other_id, status, outgoing in cur.fetchall():
+                        if status == 'accepted':
+                            statuses[other_id] = 'friends'
+                        elif statuses[other_id] != 'friends':
+                            statuses[other_id] = 'outgoing' if outgoing else 'incoming'
+                    if int(user_id) in statuses:
+                        statuses[int(user_id)] = 'self'
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'statuses': {str(i): s for i, s in statuses.items()}})
+                    }
+                
+                if request_type == 'suggestions':
+                    try:
+                        limit = min(max(int(params.get('limit', 20)), 1), MAX_SUGGESTIONS)
+                    except ValueError:
+                        limit = 20
+                    
+                    cur.execute(SUGGESTIONS_QUERY, (user_id, limit))
+                    ranked = cur.fetchall()
+                    people = profile_cache.get_many([r[0] for r in ranked], cur)
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'suggestions': [{
+                                'id': r[0],
+                                'username': people[r[0]]['username'],
+                                'full_name': people[r[0]]['full_name'],
+                                'avatar_url': people[r[0]]['avatar_url'],
+                                'mutual_count': r[1]
+                            } for r in ranked if r[0] in people]
+                        })
+                    }
+                
+                if request_type == 'mutual':
+                    other_user_id = params.get('other_user_id')
+                    try:
+                        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                        after_id = int(params.get('cursor') or 0)
+                        other_user_id = int(other_user_id)
+                    except (TypeError, ValueError):
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'other_user_id is required; limit and cursor must be integers'})
+                        }
+                    
+                    cur.execute(
+                        "SELECT mutual_count FROM friend_of_friend WHERE user_id = %s AND candidate_id = %s",
+                        (user_id, other_user_id)
+                    )
+                    count = cur.fetchone()
+                    
+                    cur.execute(MUTUAL_FRIENDS_QUERY, (other_user_id, user_id, after_id, limit + 1))
+                    mutual_ids = [r[0] for r in cur.fetchall()]
+                    next_cursor = str(mutual_ids[limit - 1]) if len(mutual_ids) > limit else None
+                    people = profile_cache.get_many(mutual_ids[:limit], cur)
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'count': count[0] if count else 0,
+                            'mutual': [{
+                                'id': people[fid]['id'],
+                                'username': people[fid]['username'],
+                                'full_name': people[fid]['full_name'],
+                                'avatar_url': people[fid]['avatar_url']
+                            } for fid in mutual_ids[:limit] if fid in people],
+                            'next_cursor': next_cursor
+                        })
+                    }
+                
                 if request_type == 'pending':
                     cur.execute("""
-                        SELECT f.id, f.user_id, u.username, u.full_name, u.avatar_url, f.created_at
+                        SELECT f.id, f.user_id, f.created_at
                         FROM friends f
-                        JOIN users u ON f.user_id = u.id
                         WHERE f.friend_id = %s AND f.status = 'pending'
                         ORDER BY f.created_at DESC
                     """, (user_id,))
                     
                     requests = cur.fetchall()
+                    senders = profile_cache.get_many([r[1] for r in requests], cur)
                     
                     return {
                         'statusCode': 200,
@@ -154,37 +389,61 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps([{
                             'id': r[0],
                             'user_id': r[1],
-                            'username': r[2],
-                            'full_name': r[3],
-                            'avatar_url': r[4],
-                            'created_at': r[5].isoformat() if r[5] else None
-                        } for r in requests])
+                            'username': senders[r[1]]['username'],
+                            'full_name': senders[r[1]]['full_name'],
+                            'avatar_url': senders[r[1]]['avatar_url'],
+                            'created_at': r[2].isoformat() if r[2] else None
+                        } for r in requests if r[1] in senders])
+                    }
+                
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    after_id = int(params.get('cursor') or 0)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid limit or cursor'})
                     }
                 
                 cur.execute("""
-                    SELECT u.id, u.username, u.full_name, u.avatar_url, u.bio
+                    SELECT f.friend_id
                     FROM friends f
-                    JOIN users u ON (f.friend_id = u.id AND f.user_id = %s) OR (f.user_id = u.id AND f.friend_id = %s)
-                    WHERE f.status = 'accepted' AND u.id != %s
-                    ORDER BY u.username
-                """, (user_id, user_id, user_id))
+                    WHERE f.user_id = %s AND f.friend_id > %s AND f.status = 'accepted'
+                    ORDER BY f.friend_id
+                    LIMIT %s
+                """, (user_id, after_id, limit + 1))
                 
-                friends = cur.fetchall()
+                friend_ids = [r[0] for r in cur.fetchall()]
+                next_cursor = str(friend_ids[limit - 1]) if len(friend_ids) > limit else None
+                profiles = profile_cache.get_many(friend_ids[:limit], cur)
+                friends = [profiles[fid] for fid in friend_ids[:limit] if fid in profiles]
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps([{
-                        'id': f[0],
-                        'username': f[1],
-                        'full_name': f[2],
-                        'avatar_url': f[3],
-                        'bio': f[4]
-                    } for f in friends])
+                    'body': json.dumps({
+                        'friends': [{
+                            'id': f['id'],
+                            'username': f['username'],
+                            'full_name': f['full_name'],
+                            'avatar_url': f['avatar_url'],
+                            'bio': f['bio']
+                        } for f in friends],
+                        'next_cursor': next_cursor
+                    })
                 }
+    except AuthError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
     finally:
-        conn.close()
+        pool.putconn(conn)
     
     return {
         'statusCode': 405,
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+PROFILE_COLUMNS = ('id', 'email', 'username', 'full_name', 'avatar_url', 'bio', 'created_at')
+
+logger = logging.getLogger('profiles.cache')
+if os.environ.get('LOG_LEVEL'):
+    logging.basicConfig()
+    logger.setLevel(os.environ['LOG_LEVEL'].upper())
+
+
+class _LocalStore:
+    '''SQLite file shared by every process on the instance; entries expire by wall clock'''
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS profiles (id INTEGER PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        ids = list(ids)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, data FROM profiles WHERE expires_at > ? AND id IN (%s)' % ','.join('?' * len(ids)),
+                [time.time()] + ids
+            ).fetchall()
+        return {r[0]: json.loads(r[1]) for r in rows}
+
+    def put_many(self, profiles: Dict[int, Dict[str, Any]]) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO profiles (id, data, expires_at) VALUES (?, ?, ?)',
+                [(uid, json.dumps(p), expires_at) for uid, p in profiles.items()]
+            )
+
+    def delete(self, user_id: int) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM profiles WHERE id = ?', (user_id,))
+
+
+class ProfileCache:
+    '''
+    Business: Read-through cache of user profiles: in-process LRU with TTL, optionally backed by a local shared store
+    Args: max_size - LRU capacity; ttl - seconds an entry stays fresh; store_path - SQLite file for the shared store
+    '''
+
+    def __init__(self, max_size: int = 5000, ttl: float = 60.0, store_path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = _LocalStore(store_path, ttl) if store_path else None
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def _put_local(self, profiles: Dict[int, Dict[str, Any]]) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for uid, profile in profiles.items():
+                self._entries[uid] = (expires_at, profile)
+                self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_many(self, ids: Iterable[Any], cur: Any) -> Dict[int, Dict[str, Any]]:
+        '''
+        Business: Hydrates many users at once, loading every miss with a single query
+        Args: ids - user ids (duplicates and None are ignored); cur - cursor used for misses
+        Returns: Dict user id -> profile for the users that exist
+        '''
+        wanted = {int(i) for i in ids if i is not None}
+        found: Dict[int, Dict[str, Any]] = {}
+        now = time.monotonic()
+        with self._lock:
+            for uid in wanted:
+                entry = self._entries.get(uid)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(uid)
+                    found[uid] = entry[1]
+            self.hits += len(found)
+        missing = wanted - found.keys()
+
+        if missing and self._store:
+            stored = self._store.get_many(missing)
+            self._put_local(stored)
+            found.update(stored)
+            self.store_hits += len(stored)
+            missing -= stored.keys()
+
+        if missing:
+            self.misses += len(missing)
+            cur.execute(
+                "SELECT %s FROM users WHERE id = ANY(%%s)" % ', '.join(PROFILE_COLUMNS),
+                (list(missing),)
+            )
+            loaded = {}
+            for row in cur.fetchall():
+                profile = dict(zip(PROFILE_COLUMNS, row))
+                profile['created_at'] = profile['created_at'].isoformat() if profile['created_at'] else None
+                loaded[profile['id']] = profile
+            self._put_local(loaded)
+            if self._store and loaded:
+                self._store.put_many(loaded)
+            found.update(loaded)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('profile cache stats %s', json.dumps(self.stats()))
+        return found
+
+    def get(self, user_id: Any, cur: Any) -> Optional[Dict[str, Any]]:
+        return self.get_many([user_id], cur).get(int(user_id))
+
+    def invalidate(self, user_id: Any) -> None:
+        '''
+        Business: Drops a user from both cache tiers after a profile change
+        Args: user_id - changed user
+        '''
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+        if self._store:
+            self._store.delete(int(user_id))
+
+    def stats(self) -> Dict[str, Any]:
+        '''
+        Business: Snapshot of cache size and hit/store-hit/miss counters; logged at DEBUG after every lookup
+        Returns: Dict of counters since the instance started
+        '''
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses
+            }
+
+
+profile_cache = ProfileCache(
+    max_size=int(os.environ.get('PROFILE_CACHE_SIZE', '5000')),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', '60')),
+    store_path=os.environ.get('PROFILE_CACHE_PATH') or None
+)
@@ -1,8 +1,51 @@
 import json
 import os
-import psycopg2
+import select
+import threading
+import time
 from typing import Dict, Any
 
+from db import PoolTimeout, get_pool
+from profiles import profile_cache
+from responses import fetch_dicts, json_response
+from session import AuthError, authenticate
+
+PREVIEW_LENGTH = 200
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_POLL_WAIT = 25.0
+MAX_MARK_READ_IDS = 1000
+MAX_POLL_WAITERS = int(os.environ.get('MESSAGES_MAX_WAITERS', '2'))
+
+_waiters = 0
+_waiters_lock = threading.Lock()
+
+def events_channel(user_id: Any) -> str:
+    '''
+    Business: Name of the LISTEN/NOTIFY channel carrying a user's realtime events
+    Args: user_id - recipient id
+    Returns: Channel name; raises ValueError for a non-numeric id
+    '''
+    return 'user_events_%d' % int(user_id)
+
+def claim_waiter(pool_size: int) -> bool:
+    '''
+    Business: Reserves a long-poll slot so parked requests never hold every pooled connection
+    Args: pool_size - max connections of this instance's pool
+    Returns: True when the caller may wait; it must call release_waiter() afterwards
+    '''
+    global _waiters
+    with _waiters_lock:
+        if _waiters >= min(MAX_POLL_WAITERS, pool_size - 1):
+            return False
+        _waiters += 1
+        return True
+
+def release_waiter() -> None:
+    global _waiters
+    with _waiters_lock:
+        _waiters -= 1
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Private messaging system between users
@@ -17,7 +60,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,12 +75,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Database configuration error'})
         }
     
-    conn = psycopg2.connect(database_url)
+    pool = get_pool(database_url)
+    try:
+        conn = pool.getconn()
+    except PoolTimeout:
+        return {
+            'statusCode': 503,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Service is busy, try again later'})
+        }
     try:
+        session_user_id = authenticate(event, conn)
         with conn.cursor() as cur:
             if method == 'POST':
                 body_data = json.loads(event.get('body', '{}'))
-                sender_id = body_data.get('sender_id')
+                sender_id = session_user_id or body_data.get('sender_id')
                 receiver_id = body_data.get('receiver_id')
                 content = body_data.get('content', '')
                 
@@ -49,6 +102,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'sender_id, receiver_id and content are required'})
                     }
                 
+                if str(sender_id) == str(receiver_id):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'sender_id and receiver_id must differ'})
+                    }
+                
                 cur.execute("""
                     INSERT INTO messages (sender_id, receiver_id, content)
                     VALUES (%s, %s, %s)
@@ -56,6 +117,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 """, (sender_id, receiver_id, content))
                 
                 message = cur.fetchone()
+                
+                cur.execute("""
+                    INSERT INTO conversations
+                        (user_id, other_user_id, last_message_id, last_sender_id, last_message_preview, last_message_at, unread_count)
+                    VALUES (%s, %s, %s, %s, %s, %s, 0), (%s, %s, %s, %s, %s, %s, 1)
+                    ON CONFLICT (user_id, other_user_id) DO UPDATE SET
+                        last_message_id = GREATEST(conversations.last_message_id, EXCLUDED.last_message_id),
+                        last_sender_id = CASE WHEN EXCLUDED.last_message_id > conversations.last_message_id
+                                              THEN EXCLUDED.last_sender_id ELSE conversations.last_sender_id END,
+                        last_message_preview = CASE WHEN EXCLUDED.last_message_id > conversations.last_message_id
+                                                    THEN EXCLUDED.last_message_preview ELSE conversations.last_message_preview END,
+                        last_message_at = GREATEST(conversations.last_message_at, EXCLUDED.last_message_at),
+                        unread_count = conversations.unread_count + EXCLUDED.unread_count
+                """, (
+                    message[1], message[2], message[0], message[1], message[3][:PREVIEW_LENGTH], message[5],
+                    message[2], message[1], message[0], message[1], message[3][:PREVIEW_LENGTH], message[5]
+                ))
+                cur.execute("SELECT pg_notify(%s, %s)", (events_channel(message[2]), json.dumps({
+                    'type': 'message',
+                    'id': message[0],
+                    'sender_id': message[1],
+                    'created_at': message[5].isoformat() if message[5] else None
+                })))
                 conn.commit()
                 
                 return {
@@ -74,34 +158,73 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if method == 'PUT':
                 body_data = json.loads(event.get('body', '{}'))
-                user_id = body_data.get('user_id')
+                user_id = session_user_id or body_data.get('user_id')
                 message_id = body_data.get('message_id')
+                message_ids = body_data.get('message_ids')
+                with_user_id = body_data.get('with_user_id')
+                up_to_id = body_data.get('up_to_id')
+                
+                if message_id:
+                    message_ids = [message_id]
+                
+                if not user_id or not (message_ids or (with_user_id and up_to_id)):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'user_id and message_id, message_ids or with_user_id with up_to_id are required'})
+                    }
                 
-                if not user_id or not message_id:
+                if message_ids and (not isinstance(message_ids, list) or len(message_ids) > MAX_MARK_READ_IDS):
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'isBase64Encoded': False,
-                        'body': json.dumps({'error': 'user_id and message_id are required'})
+                        'body': json.dumps({'error': 'message_ids must be a list of at most %d ids' % MAX_MARK_READ_IDS})
                     }
                 
+                if message_ids:
+                    condition = "id = ANY(%s::int[])"
+                    condition_params = (message_ids,)
+                else:
+                    condition = "sender_id = %s AND id <= %s"
+                    condition_params = (with_user_id, up_to_id)
+                
                 cur.execute("""
-                    UPDATE messages
-                    SET is_read = true
-                    WHERE id = %s AND receiver_id = %s
-                """, (message_id, user_id))
+                    WITH marked AS (
+                        UPDATE messages
+                        SET is_read = true
+                        WHERE receiver_id = %s AND is_read = false AND {}
+                        RETURNING sender_id
+                    ),
+                    per_sender AS (
+                        SELECT sender_id, COUNT(*) AS cnt FROM marked GROUP BY sender_id
+                    ),
+                    updated AS (
+                        UPDATE conversations c
+                        SET unread_count = GREATEST(c.unread_count - p.cnt, 0)
+                        FROM per_sender p
+                        WHERE c.user_id = %s AND c.other_user_id = p.sender_id
+                        RETURNING c.other_user_id
+                    )
+                    SELECT COALESCE(SUM(cnt), 0) FROM per_sender
+                """.format(condition), (user_id,) + condition_params + (user_id,))
+                marked = cur.fetchone()[0]
+                
+                cur.execute("SELECT COALESCE(SUM(unread_count), 0) FROM conversations WHERE user_id = %s", (user_id,))
+                unread_count = cur.fetchone()[0]
                 conn.commit()
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
+                    'body': json.dumps({'success': True, 'marked': int(marked), 'unread_count': int(unread_count)})
                 }
             
             if method == 'GET':
                 params = event.get('queryStringParameters', {})
-                user_id = params.get('user_id')
+                user_id = session_user_id or params.get('user_id')
                 with_user_id = params.get('with_user_id')
                 
                 if not user_id:
@@ -112,77 +235,163 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'user_id is required'})
                     }
                 
-                if with_user_id:
-                    cur.execute("""
-                        SELECT m.id, m.sender_id, m.receiver_id, m.content, m.is_read, m.created_at,
-                               u.username, u.avatar_url
-                        FROM messages m
-                        JOIN users u ON u.id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END
-                        WHERE (m.sender_id = %s AND m.receiver_id = %s) OR (m.sender_id = %s AND m.receiver_id = %s)
-                        ORDER BY m.created_at ASC
-                    """, (user_id, user_id, with_user_id, with_user_id, user_id))
+                if params.get('wait'):
+                    try:
+                        wait = min(max(float(params['wait']), 0.0), MAX_POLL_WAIT)
+                        since_id = int(params.get('since_id') or 0)
+                        channel = events_channel(user_id)
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'wait, user_id and since_id must be numbers'})
+                        }
                     
-                    messages = cur.fetchall()
+                    if not claim_waiter(pool.max_size):
+                        return {
+                            'statusCode': 503,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Too many open long-polls, retry or poll without wait'})
+                        }
+                    
+                    try:
+                        cur.execute("LISTEN " + channel)
+                        conn.commit()
+                        events = []
+                        if since_id:
+                            cur.execute("""
+                                SELECT id, sender_id, created_at
+                                FROM messages
+                                WHERE receiver_id = %s AND id > %s
+                                ORDER BY id
+                                LIMIT %s
+                            """, (user_id, since_id, MAX_PAGE_SIZE))
+                            events = [{
+                                'type': 'message',
+                                'id': m[0],
+                                'sender_id': m[1],
+                                'created_at': m[2].isoformat() if m[2] else None
+                            } for m in cur.fetchall()]
+                            conn.commit()
+                        
+                        seen = {(e['type'], e['id']) for e in events}
+                        deadline = time.monotonic() + wait
+                        while True:
+                            while conn.notifies:
+                                payload = json.loads(conn.notifies.pop(0).payload)
+                                if (payload.get('type'), payload.get('id')) not in seen:
+                                    events.append(payload)
+                            if events:
+                                break
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0 or select.select([conn], [], [], remaining) == ([], [], []):
+                                break
+                            conn.poll()
+                    finally:
+                        release_waiter()
+                        cur.execute("UNLISTEN *")
+                        conn.commit()
+                        del conn.notifies[:]
                     
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'isBase64Encoded': False,
-                        'body': json.dumps([{
-                            'id': m[0],
-                            'sender_id': m[1],
-                            'receiver_id': m[2],
-                            'content': m[3],
-                            'is_read': m[4],
-                            'created_at': m[5].isoformat() if m[5] else None,
-                            'username': m[6],
-                            'avatar_url': m[7]
-                        } for m in messages])
+                        'body': json.dumps({'events': events, 'timed_out': not events})
                     }
                 
+                if with_user_id:
+                    before_id = params.get('before_id')
+                    since_id = params.get('since_id')
+                    try:
+                        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                        with_user_id = int(with_user_id)
+                        before_id = int(before_id) if before_id else None
+                        since_id = int(since_id) if since_id else None
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'with_user_id, limit, before_id and since_id must be integers'})
+                        }
+                    
+                    if since_id:
+                        condition = "AND (created_at, id) > (SELECT created_at, id FROM messages WHERE id = %s)"
+                        direction = "ASC"
+                        anchor = (since_id,)
+                    else:
+                        condition = "AND (created_at, id) < (SELECT created_at, id FROM messages WHERE id = %s)" if before_id else ""
+                        direction = "DESC"
+                        anchor = (before_id,) if before_id else ()
+                    
+                    cur.execute("""
+                        SELECT id, sender_id, receiver_id, content, is_read, created_at
+                        FROM (
+                            (SELECT id, sender_id, receiver_id, content, is_read, created_at
+                             FROM messages
+                             WHERE sender_id = %s AND receiver_id = %s {cond}
+                             ORDER BY created_at {dir}, id {dir}
+                             LIMIT %s)
+                            UNION ALL
+                            (SELECT id, sender_id, receiver_id, content, is_read, created_at
+                             FROM messages
+                             WHERE sender_id = %s AND receiver_id = %s {cond}
+                             ORDER BY created_at {dir}, id {dir}
+                             LIMIT %s)
+                        ) m
+                        ORDER BY created_at {dir}, id {dir}
+                        LIMIT %s
+                    """.format(cond=condition, dir=direction),
+                        (user_id, with_user_id) + anchor + (limit + 1,) +
+                        (with_user_id, user_id) + anchor + (limit + 1,) +
+                        (limit + 1,))
+                    
+                    messages = fetch_dicts(cur)
+                    has_more = len(messages) > limit
+                    messages = messages[:limit]
+                    if direction == "DESC":
+                        messages.reverse()
+                    
+                    other = profile_cache.get(with_user_id, cur)
+                    
+                    return json_response(event, 200, {
+                        'user': {
+                            'id': other['id'],
+                            'username': other['username'],
+                            'full_name': other['full_name'],
+                            'avatar_url': other['avatar_url']
+                        } if other else None,
+                        'messages': messages,
+                        'has_more': has_more
+                    }, etag=True)
+                
                 cur.execute("""
-                    SELECT DISTINCT ON (other_user_id)
-                           other_user_id,
-                           username,
-                           avatar_url,
-                           last_message,
-                           last_message_time,
-                           unread_count
-                    FROM (
-                        SELECT 
-                            CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END as other_user_id,
-                            u.username,
-                            u.avatar_url,
-                            m.content as last_message,
-                            m.created_at as last_message_time,
-                            (SELECT COUNT(*) FROM messages WHERE sender_id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END 
-                             AND receiver_id = %s AND is_read = false) as unread_count,
-                            ROW_NUMBER() OVER (PARTITION BY CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END ORDER BY m.created_at DESC) as rn
-                        FROM messages m
-                        JOIN users u ON u.id = CASE WHEN m.sender_id = %s THEN m.receiver_id ELSE m.sender_id END
-                        WHERE m.sender_id = %s OR m.receiver_id = %s
-                    ) sub
-                    WHERE rn = 1
-                    ORDER BY last_message_time DESC
-                """, (user_id, user_id, user_id, user_id, user_id, user_id, user_id))
-                
-                conversations = cur.fetchall()
+                    SELECT c.other_user_id AS user_id, c.last_message_preview AS last_message,
+                           c.last_message_at AS last_message_time, c.unread_count
+                    FROM conversations c
+                    WHERE c.user_id = %s
+                    ORDER BY c.last_message_at DESC
+                """, (user_id,))
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps([{
-                        'user_id': c[0],
-                        'username': c[1],
-                        'avatar_url': c[2],
-                        'last_message': c[3],
-                        'last_message_time': c[4].isoformat() if c[4] else None,
-                        'unread_count': c[5]
-                    } for c in conversations])
-                }
+                conversations = fetch_dicts(cur)
+                peers = profile_cache.get_many([c['user_id'] for c in conversations], cur)
+                
+                return json_response(event, 200, [
+                    dict(c, username=peers[c['user_id']]['username'], avatar_url=peers[c['user_id']]['avatar_url'])
+                    for c in conversations if c['user_id'] in peers
+                ], etag=True)
+    except AuthError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
     finally:
-        conn.close()
+        pool.putconn(conn)
     
     return {
         'statusCode': 405,
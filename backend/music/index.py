@@ -1,7 +1,162 @@
+import base64
+import binascii
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from db import get_pool
+from session import AuthError, authenticate
+
+POSITION_GAP = 1024
+MAX_BULK_TRACKS = 1000
+UPDATABLE_PLAYLIST_FIELDS = ('name', 'description', 'cover_url', 'is_public')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_TOP_TRACKS = 20
+MAX_TOP_TRACKS = 100
+
+SAVE_TRACK_QUERY = """
+    WITH catalog AS (
+        INSERT INTO music_catalog (platform, external_id, title, artist, thumbnail_url, url, save_count)
+        VALUES (%(platform)s, %(external_id)s, %(title)s, %(artist)s, %(thumbnail_url)s, %(url)s, 0)
+        ON CONFLICT (platform, external_id) DO UPDATE
+        SET save_count = music_catalog.save_count
+        RETURNING id, platform, external_id, title, artist, thumbnail_url, url
+    ),
+    saved AS (
+        INSERT INTO music (user_id, track_id, platform)
+        SELECT %(user_id)s, id, platform FROM catalog
+        ON CONFLICT (user_id, track_id) DO NOTHING
+        RETURNING id, user_id, track_id, created_at
+    )
+    SELECT COALESCE(s.id, m.id), COALESCE(s.user_id, m.user_id), c.platform, c.external_id, c.title, c.artist,
+           c.thumbnail_url, c.url, COALESCE(s.created_at, m.created_at), c.id, s.id IS NOT NULL
+    FROM catalog c
+    LEFT JOIN saved s ON s.track_id = c.id
+    LEFT JOIN music m ON m.user_id = %(user_id)s AND m.track_id = c.id
+"""
+
+ADD_TRACKS_QUERY = """
+    WITH base AS (
+        SELECT COALESCE(MAX(t.position), 0) AS position
+        FROM tracks t
+        WHERE t.playlist_id = %(playlist_id)s
+    ),
+    ins AS (
+        INSERT INTO tracks (playlist_id, title, artist, url, duration, position)
+        SELECT %(playlist_id)s, n.title, n.artist, n.url, n.duration, base.position + n.ord * {gap}
+        FROM base,
+             unnest(%(titles)s::text[], %(artists)s::text[], %(urls)s::text[], %(durations)s::int[])
+                 WITH ORDINALITY AS n(title, artist, url, duration, ord)
+        RETURNING id, title, artist, url, duration, position, added_at
+    ),
+    counted AS (
+        UPDATE playlists
+        SET track_count = track_count + (SELECT COUNT(*) FROM ins), updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(playlist_id)s
+    )
+    SELECT id, title, artist, url, duration, position, added_at FROM ins ORDER BY position
+""".format(gap=POSITION_GAP)
+
+RESPACE_TRACKS_QUERY = """
+    UPDATE tracks t
+    SET position = r.rn * {gap}
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY position, id) AS rn
+        FROM tracks
+        WHERE playlist_id = %s
+    ) r
+    WHERE t.id = r.id AND t.position <> r.rn * {gap}
+""".format(gap=POSITION_GAP)
+
+def playlist_json(p: Any) -> Dict[str, Any]:
+    return {
+        'id': p[0],
+        'user_id': p[1],
+        'name': p[2],
+        'description': p[3],
+        'cover_url': p[4],
+        'is_public': p[5],
+        'track_count': p[6],
+        'created_at': p[7].isoformat() if p[7] else None,
+        'updated_at': p[8].isoformat() if p[8] else None
+    }
+
+def encode_cursor(created_at: datetime, save_id: int) -> str:
+    '''
+    Business: Packs the (created_at, id) of the last row on a page into an opaque cursor
+    Args: created_at - save timestamp; save_id - music row id
+    Returns: URL-safe cursor string
+    '''
+    raw = json.dumps([created_at.isoformat(), save_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    '''
+    Business: Unpacks a cursor produced by encode_cursor
+    Args: cursor - opaque cursor from a previous page
+    Returns: (created_at, id) keyset position; raises ValueError when malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, save_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(save_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def saved_track_json(t: Any) -> Dict[str, Any]:
+    return {
+        'id': t[0],
+        'user_id': t[1],
+        'platform': t[2],
+        'external_id': t[3],
+        'title': t[4],
+        'artist': t[5],
+        'thumbnail_url': t[6],
+        'url': t[7],
+        'created_at': t[8].isoformat() if t[8] else None,
+        'catalog_id': t[9]
+    }
+
+def track_json(t: Any) -> Dict[str, Any]:
+    return {
+        'id': t[0],
+        'title': t[1],
+        'artist': t[2],
+        'url': t[3],
+        'duration': t[4],
+        'position': t[5],
+        'added_at': t[6].isoformat() if t[6] else None
+    }
+
+def slot_after(cur: Any, playlist_id: int, track_id: int, after_track_id: Optional[int]) -> Optional[int]:
+    '''
+    Business: Picks a position for a track right after another one, halfway into the gap between neighbours
+    Args: cur - cursor holding the playlist row lock; playlist_id - playlist; track_id - track being moved;
+          after_track_id - new predecessor, None to move to the top
+    Returns: New position, None when the neighbours are adjacent and the playlist needs respacing;
+             raises LookupError when after_track_id is not in the playlist
+    '''
+    low = 0
+    if after_track_id:
+        cur.execute("SELECT position FROM tracks WHERE id = %s AND playlist_id = %s", (after_track_id, playlist_id))
+        row = cur.fetchone()
+        if not row:
+            raise LookupError('after_track_id is not in the playlist')
+        low = row[0]
+    cur.execute("""
+        SELECT position FROM tracks
+        WHERE playlist_id = %s AND position > %s AND id <> %s
+        ORDER BY position, id
+        LIMIT 1
+    """, (playlist_id, low, track_id))
+    row = cur.fetchone()
+    if not row:
+        return low + POSITION_GAP
+    if row[0] - low < 2:
+        return None
+    return (low + row[0]) // 2
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -17,7 +172,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token',
                 'Access-Control-Allow-Age': '86400'
             },
             'body': ''
@@ -32,12 +187,182 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Database configuration error'})
         }
     
-    conn = psycopg2.connect(database_url)
+    pool = get_pool(database_url)
+    conn = pool.getconn()
     try:
+        session_user_id = authenticate(event, conn)
         with conn.cursor() as cur:
             if method == 'POST':
                 body_data = json.loads(event.get('body', '{}'))
-                user_id = body_data.get('user_id')
+                action = body_data.get('action', 'save_track')
+                user_id = session_user_id or body_data.get('user_id')
+                playlist_id = body_data.get('playlist_id')
+                
+                if action == 'create_playlist':
+                    name = (body_data.get('name') or '').strip()
+                    if not user_id or not name:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'user_id and name are required'})
+                        }
+                    
+                    cur.execute("""
+                        INSERT INTO playlists (user_id, name, description, cover_url, is_public)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING id, user_id, name, description, cover_url, is_public, track_count, created_at, updated_at
+                    """, (user_id, name, body_data.get('description', ''), body_data.get('cover_url'),
+                          bool(body_data.get('is_public', True))))
+                    playlist = cur.fetchone()
+                    conn.commit()
+                    
+                    return {
+                        'statusCode': 201,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'playlist': playlist_json(playlist)})
+                    }
+                
+                if action in ('update_playlist', 'delete_playlist', 'add_tracks', 'move_track', 'reorder_tracks', 'remove_tracks'):
+                    if not user_id or not playlist_id:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'user_id and playlist_id are required'})
+                        }
+                    
+                    cur.execute("SELECT id FROM playlists WHERE id = %s AND user_id = %s FOR UPDATE", (playlist_id, user_id))
+                    if not cur.fetchone():
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Playlist not found'})
+                        }
+                    
+                    if action == 'add_tracks':
+                        tracks: List[Dict[str, Any]] = body_data.get('tracks') or []
+                        if (not isinstance(tracks, list) or not 0 < len(tracks) <= MAX_BULK_TRACKS
+                                or not all(isinstance(t, dict) and t.get('title') and t.get('url') for t in tracks)):
+                            conn.rollback()
+                            return {
+                                'statusCode': 400,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'tracks must be a list of 1 to %d items with title and url' % MAX_BULK_TRACKS})
+                            }
+                        
+                        cur.execute(ADD_TRACKS_QUERY, {
+                            'playlist_id': playlist_id,
+                            'titles': [t['title'] for t in tracks],
+                            'artists': [t.get('artist') or '' for t in tracks],
+                            'urls': [t['url'] for t in tracks],
+                            'durations': [t.get('duration') for t in tracks]
+                        })
+                        added = cur.fetchall()
+                        conn.commit()
+                        
+                        return {
+                            'statusCode': 201,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'success': True, 'tracks': [track_json(t) for t in added]})
+                        }
+                    
+                    if action == 'update_playlist':
+                        changes = {k: body_data[k] for k in UPDATABLE_PLAYLIST_FIELDS if k in body_data}
+                        if changes:
+                            cur.execute(
+                                "UPDATE playlists SET {} WHERE id = %s".format(', '.join('%s = %%s' % k for k in changes)),
+                                list(changes.values()) + [playlist_id]
+                            )
+                    
+                    if action == 'delete_playlist':
+                        cur.execute("DELETE FROM tracks WHERE playlist_id = %s", (playlist_id,))
+                        cur.execute("DELETE FROM playlists WHERE id = %s", (playlist_id,))
+                    
+                    if action == 'move_track':
+                        track_id = body_data.get('track_id')
+                        after_track_id = body_data.get('after_track_id')
+                        cur.execute("SELECT id FROM tracks WHERE id = %s AND playlist_id = %s", (track_id, playlist_id))
+                        try:
+                            if not track_id or not cur.fetchone():
+                                raise LookupError('track_id is not in the playlist')
+                            position = slot_after(cur, playlist_id, track_id, after_track_id)
+                            if position is None:
+                                cur.execute(RESPACE_TRACKS_QUERY, (playlist_id,))
+                                position = slot_after(cur, playlist_id, track_id, after_track_id)
+                        except LookupError as e:
+                            conn.rollback()
+                            return {
+                                'statusCode': 404,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': str(e)})
+                            }
+                        cur.execute("UPDATE tracks SET position = %s WHERE id = %s", (position, track_id))
+                    
+                    if action == 'reorder_tracks':
+                        track_ids = body_data.get('track_ids')
+                        if not isinstance(track_ids, list) or not track_ids or len(track_ids) > MAX_BULK_TRACKS:
+                            conn.rollback()
+                            return {
+                                'statusCode': 400,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'track_ids must be a list of 1 to %d ids' % MAX_BULK_TRACKS})
+                            }
+                        cur.execute("SELECT id FROM tracks WHERE playlist_id = %s", (playlist_id,))
+                        current = {r[0] for r in cur.fetchall()}
+                        if len(track_ids) != len(current) or set(track_ids) != current:
+                            conn.rollback()
+                            return {
+                                'statusCode': 400,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'track_ids must list every track of the playlist exactly once'})
+                            }
+                        cur.execute("""
+                            UPDATE tracks t
+                            SET position = o.ord * %s
+                            FROM unnest(%s::int[]) WITH ORDINALITY AS o(id, ord)
+                            WHERE t.id = o.id AND t.playlist_id = %s
+                        """, (POSITION_GAP, track_ids, playlist_id))
+                    
+                    if action == 'remove_tracks':
+                        track_ids = body_data.get('track_ids')
+                        if not isinstance(track_ids, list) or not track_ids or len(track_ids) > MAX_BULK_TRACKS:
+                            conn.rollback()
+                            return {
+                                'statusCode': 400,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'track_ids must be a list of 1 to %d ids' % MAX_BULK_TRACKS})
+                            }
+                        cur.execute("""
+                            WITH removed AS (
+                                DELETE FROM tracks
+                                WHERE playlist_id = %s AND id = ANY(%s::int[])
+                                RETURNING id
+                            )
+                            UPDATE playlists
+                            SET track_count = GREATEST(track_count - (SELECT COUNT(*) FROM removed), 0)
+                            WHERE id = %s
+                        """, (playlist_id, track_ids, playlist_id))
+                    
+                    if action != 'delete_playlist':
+                        cur.execute("UPDATE playlists SET updated_at = CURRENT_TIMESTAMP WHERE id = %s", (playlist_id,))
+                    conn.commit()
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True})
+                    }
+                
                 platform = body_data.get('platform', '')
                 external_id = body_data.get('external_id', '')
                 title = body_data.get('title', '')
@@ -61,36 +386,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'platform must be youtube or yandex'})
                     }
                 
-                cur.execute("""
-                    INSERT INTO music (user_id, platform, external_id, title, artist, thumbnail_url, url)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id, user_id, platform, external_id, title, artist, thumbnail_url, url, created_at
-                """, (user_id, platform, external_id, title, artist, thumbnail_url, url))
+                cur.execute(SAVE_TRACK_QUERY, {
+                    'user_id': user_id,
+                    'platform': platform,
+                    'external_id': external_id,
+                    'title': title,
+                    'artist': artist,
+                    'thumbnail_url': thumbnail_url,
+                    'url': url
+                })
                 
                 track = cur.fetchone()
+                if track[10]:
+                    cur.execute("UPDATE music_catalog SET save_count = save_count + 1 WHERE id = %s", (track[9],))
                 conn.commit()
                 
                 return {
-                    'statusCode': 201,
+                    'statusCode': 201 if track[10] else 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'id': track[0],
-                        'user_id': track[1],
-                        'platform': track[2],
-                        'external_id': track[3],
-                        'title': track[4],
-                        'artist': track[5],
-                        'thumbnail_url': track[6],
-                        'url': track[7],
-                        'created_at': track[8].isoformat() if track[8] else None
-                    })
+                    'body': json.dumps(saved_track_json(track))
                 }
             
             if method == 'DELETE':
                 params = event.get('queryStringParameters', {})
                 track_id = params.get('track_id')
-                user_id = params.get('user_id')
+                user_id = session_user_id or params.get('user_id')
                 
                 if not track_id or not user_id:
                     return {
@@ -100,7 +421,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'track_id and user_id are required'})
                     }
                 
-                cur.execute("DELETE FROM music WHERE id = %s AND user_id = %s", (track_id, user_id))
+                cur.execute("""
+                    WITH removed AS (
+                        DELETE FROM music WHERE id = %s AND user_id = %s RETURNING track_id
+                    )
+                    UPDATE music_catalog
+                    SET save_count = GREATEST(save_count - 1, 0)
+                    WHERE id IN (SELECT track_id FROM removed)
+                """, (track_id, user_id))
                 conn.commit()
                 
                 return {
@@ -112,8 +440,106 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if method == 'GET':
                 params = event.get('queryStringParameters', {})
-                user_id = params.get('user_id')
+                user_id = params.get('user_id') or session_user_id
+                viewer_id = session_user_id
                 platform = params.get('platform')
+                playlist_id = params.get('playlist_id')
+                
+                if playlist_id:
+                    cur.execute("""
+                        SELECT id, user_id, name, description, cover_url, is_public, track_count, created_at, updated_at
+                        FROM playlists
+                        WHERE id = %s
+                    """, (playlist_id,))
+                    playlist = cur.fetchone()
+                    if not playlist:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Playlist not found'})
+                        }
+                    
+                    if not playlist[5] and str(playlist[1]) != str(viewer_id):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Playlist is private'})
+                        }
+                    
+                    cur.execute("""
+                        SELECT id, title, artist, url, duration, position, added_at
+                        FROM tracks
+                        WHERE playlist_id = %s
+                        ORDER BY position, id
+                    """, (playlist_id,))
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps(dict(playlist_json(playlist), tracks=[track_json(t) for t in cur.fetchall()]))
+                    }
+                
+                if params.get('type') == 'playlists':
+                    owner_id = params.get('owner_id') or user_id
+                    if not owner_id:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'user_id is required'})
+                        }
+                    
+                    cur.execute("""
+                        SELECT id, user_id, name, description, cover_url, is_public, track_count, created_at, updated_at
+                        FROM playlists
+                        WHERE user_id = %s AND (is_public OR user_id = %s)
+                        ORDER BY created_at DESC, id DESC
+                    """, (owner_id, viewer_id))
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'playlists': [playlist_json(p) for p in cur.fetchall()]})
+                    }
+                
+                if params.get('type') == 'top':
+                    try:
+                        limit = min(max(int(params.get('limit', DEFAULT_TOP_TRACKS)), 1), MAX_TOP_TRACKS)
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'limit must be an integer'})
+                        }
+                    
+                    cur.execute("""
+                        SELECT id, platform, external_id, title, artist, thumbnail_url, url, save_count
+                        FROM music_catalog
+                        WHERE save_count > 0 {}
+                        ORDER BY save_count DESC, id DESC
+                        LIMIT %s
+                    """.format("AND platform = %s" if platform else ""), ((platform,) if platform else ()) + (limit,))
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'tracks': [{
+                            'track_id': t[0],
+                            'platform': t[1],
+                            'external_id': t[2],
+                            'title': t[3],
+                            'artist': t[4],
+                            'thumbnail_url': t[5],
+                            'url': t[6],
+                            'save_count': t[7]
+                        } for t in cur.fetchall()]})
+                    }
                 
                 if not user_id:
                     return {
@@ -123,41 +549,60 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'user_id is required'})
                     }
                 
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid limit or cursor'})
+                    }
+                
+                filters = ["m.user_id = %s"]
+                query_params: List[Any] = [user_id]
                 if platform:
-                    cur.execute("""
-                        SELECT id, user_id, platform, external_id, title, artist, thumbnail_url, url, created_at
-                        FROM music
-                        WHERE user_id = %s AND platform = %s
-                        ORDER BY created_at DESC
-                    """, (user_id, platform))
-                else:
-                    cur.execute("""
-                        SELECT id, user_id, platform, external_id, title, artist, thumbnail_url, url, created_at
-                        FROM music
-                        WHERE user_id = %s
-                        ORDER BY created_at DESC
-                    """, (user_id,))
+                    filters.append("m.platform = %s")
+                    query_params.append(platform)
+                if cursor:
+                    filters.append("m.created_at <= %s AND (m.created_at, m.id) < (%s, %s)")
+                    query_params.extend([cursor[0], cursor[0], cursor[1]])
+                query_params.append(limit + 1)
+                
+                cur.execute("""
+                    SELECT m.id, m.user_id, c.platform, c.external_id, c.title, c.artist, c.thumbnail_url, c.url, m.created_at, c.id
+                    FROM music m
+                    JOIN music_catalog c ON c.id = m.track_id
+                    WHERE {}
+                    ORDER BY m.created_at DESC, m.id DESC
+                    LIMIT %s
+                """.format(" AND ".join(filters)), query_params)
                 
                 tracks = cur.fetchall()
+                next_cursor = None
+                if len(tracks) > limit:
+                    tracks = tracks[:limit]
+                    next_cursor = encode_cursor(tracks[-1][8], tracks[-1][0])
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps([{
-                        'id': t[0],
-                        'user_id': t[1],
-                        'platform': t[2],
-                        'external_id': t[3],
-                        'title': t[4],
-                        'artist': t[5],
-                        'thumbnail_url': t[6],
-                        'url': t[7],
-                        'created_at': t[8].isoformat() if t[8] else None
-                    } for t in tracks])
+                    'body': json.dumps({
+                        'tracks': [saved_track_json(t) for t in tracks],
+                        'next_cursor': next_cursor
+                    })
                 }
+    except AuthError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
     finally:
-        conn.close()
+        pool.putconn(conn)
     
     return {
         'statusCode': 405,
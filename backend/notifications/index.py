@@ -0,0 +1,390 @@
+import base64
+import binascii
+import hmac
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from db import get_pool
+from profiles import profile_cache
+from session import AuthError, authenticate
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_MARK_READ_IDS = 1000
+GENERATE_BATCH_SIZE = 5000
+GENERATE_TIME_BUDGET = 20.0
+GENERATE_LAG = 5
+
+SOURCE_QUERIES = {
+    'likes': """
+        SELECT p.user_id, 'like', 'like:' || l.post_id, COUNT(DISTINCT l.user_id),
+               (array_agg(l.user_id ORDER BY l.id DESC))[1], l.post_id, MAX(l.created_at)
+        FROM likes l
+        JOIN posts p ON p.id = l.post_id
+        WHERE l.id > %s AND l.id <= %s AND p.user_id <> l.user_id
+        GROUP BY p.user_id, l.post_id
+    """,
+    'comments': """
+        SELECT p.user_id, 'comment', 'comment:' || c.post_id, COUNT(DISTINCT c.user_id),
+               (array_agg(c.user_id ORDER BY c.id DESC))[1], c.post_id, MAX(c.created_at)
+        FROM comments c
+        JOIN posts p ON p.id = c.post_id
+        WHERE c.id > %s AND c.id <= %s AND p.user_id <> c.user_id
+        GROUP BY p.user_id, c.post_id
+    """,
+    'friends': """
+        SELECT friend_id, kind, kind, COUNT(*), (array_agg(user_id ORDER BY id DESC))[1], NULL::int, MAX(created_at)
+        FROM (
+            SELECT r.id, r.user_id, r.friend_id, r.created_at,
+                   CASE WHEN r.status = 'accepted' AND EXISTS (
+                       SELECT 1 FROM friends f
+                       WHERE f.user_id = r.friend_id AND f.friend_id = r.user_id AND f.id < r.id
+                   ) THEN 'friend_accept' ELSE 'friend_request' END AS kind,
+                   r.status
+            FROM friends r
+            WHERE r.id > %s AND r.id <= %s
+        ) e
+        WHERE kind = 'friend_accept' OR status = 'pending'
+        GROUP BY friend_id, kind
+    """,
+    'messages': """
+        SELECT receiver_id, 'message', 'message:' || sender_id, COUNT(*), sender_id, NULL::int, MAX(created_at)
+        FROM messages
+        WHERE id > %s AND id <= %s
+        GROUP BY receiver_id, sender_id
+    """
+}
+
+UPSERT_NOTIFICATIONS_QUERY = """
+    WITH incoming AS (
+        SELECT *
+        FROM unnest(%(user_ids)s::int[], %(types)s::text[], %(keys)s::text[], %(counts)s::int[],
+                    %(actors)s::int[], %(posts)s::int[], %(contents)s::text[], %(times)s::timestamp[])
+            AS n(user_id, type, group_key, actor_count, related_user_id, related_post_id, content, created_at)
+    ),
+    upserted AS (
+        INSERT INTO notifications (user_id, type, group_key, actor_count, related_user_id, related_post_id, content, created_at)
+        SELECT user_id, type, group_key, actor_count, related_user_id, related_post_id, content, created_at
+        FROM incoming
+        ON CONFLICT (user_id, group_key) WHERE NOT is_read DO UPDATE
+        SET actor_count = notifications.actor_count + EXCLUDED.actor_count,
+            related_user_id = EXCLUDED.related_user_id,
+            content = EXCLUDED.content,
+            created_at = GREATEST(notifications.created_at, EXCLUDED.created_at)
+        RETURNING user_id, (xmax = 0) AS inserted
+    ),
+    badges AS (
+        INSERT INTO notification_badges (user_id, unread_count)
+        SELECT user_id, COUNT(*) FROM upserted WHERE inserted GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread_count = notification_badges.unread_count + EXCLUDED.unread_count
+    )
+    SELECT pg_notify('user_events_' || user_id, '{"type": "notification"}')
+    FROM (SELECT DISTINCT user_id FROM upserted) u
+"""
+
+TEXTS = {
+    'like': ('{name} оценил(а) вашу запись', '{name} и ещё {others} оценили вашу запись'),
+    'comment': ('{name} прокомментировал(а) вашу запись', '{name} и ещё {others} прокомментировали вашу запись'),
+    'friend_request': ('{name} хочет добавить вас в друзья', '{name} и ещё {others} хотят добавить вас в друзья'),
+    'friend_accept': ('{name} принял(а) вашу заявку в друзья', '{name} и ещё {others} приняли ваши заявки в друзья'),
+    'message': ('{name} отправил(а) вам сообщение', '{name} отправил(а) вам сообщения: {count}')
+}
+
+def describe(kind: str, actor: Optional[Dict[str, Any]], count: int) -> str:
+    '''
+    Business: Human-readable text of a (possibly coalesced) notification
+    Args: kind - notification type; actor - profile of the latest actor; count - events folded into it
+    Returns: Text such as "Иван и ещё 11 оценили вашу запись"
+    '''
+    name = (actor.get('full_name') or actor.get('username')) if actor else 'Кто-то'
+    one, many = TEXTS.get(kind, ('{name}', '{name}'))
+    return (many if count > 1 else one).format(name=name, others=count - 1, count=count)
+
+def generate(conn: Any, source: str, deadline: float) -> int:
+    '''
+    Business: Turns new rows of one source table into coalesced notifications, one batch per transaction
+    Args: conn - pooled connection; source - key of SOURCE_QUERIES; deadline - time.monotonic() to stop at
+    Returns: Number of notifications inserted or folded; rows younger than GENERATE_LAG seconds wait for the next run
+    '''
+    produced = 0
+    while time.monotonic() < deadline:
+        with conn.cursor() as cur:
+            cur.execute("SELECT last_id FROM notification_sources WHERE source = %s FOR UPDATE SKIP LOCKED", (source,))
+            row = cur.fetchone()
+            if not row:
+                conn.rollback()
+                break
+            after_id = row[0]
+            
+            cur.execute("""
+                SELECT MAX(id) FROM (
+                    SELECT id FROM {}
+                    WHERE id > %s AND created_at < LOCALTIMESTAMP - %s * interval '1 second'
+                    ORDER BY id
+                    LIMIT %s
+                ) b
+            """.format(source), (after_id, GENERATE_LAG, GENERATE_BATCH_SIZE))
+            upper_id = cur.fetchone()[0]
+            if upper_id is None:
+                conn.rollback()
+                break
+            
+            cur.execute(SOURCE_QUERIES[source], (after_id, upper_id))
+            events = cur.fetchall()
+            if events:
+                actors = profile_cache.get_many([e[4] for e in events], cur)
+                cur.execute(UPSERT_NOTIFICATIONS_QUERY, {
+                    'user_ids': [e[0] for e in events],
+                    'types': [e[1] for e in events],
+                    'keys': [e[2] for e in events],
+                    'counts': [e[3] for e in events],
+                    'actors': [e[4] for e in events],
+                    'posts': [e[5] for e in events],
+                    'contents': [describe(e[1], actors.get(e[4]), e[3]) for e in events],
+                    'times': [e[6] for e in events]
+                })
+            cur.execute("UPDATE notification_sources SET last_id = %s WHERE source = %s", (upper_id, source))
+            conn.commit()
+            produced += len(events)
+    return produced
+
+def encode_cursor(created_at: datetime, notification_id: int) -> str:
+    '''
+    Business: Packs the (created_at, id) of the last row on a page into an opaque cursor
+    Args: created_at - notification timestamp; notification_id - notification id
+    Returns: URL-safe cursor string
+    '''
+    raw = json.dumps([created_at.isoformat(), notification_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    '''
+    Business: Unpacks a cursor produced by encode_cursor
+    Args: cursor - opaque cursor from a previous page
+    Returns: (created_at, id) keyset position; raises ValueError when malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, notification_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def is_cron_request(event: Dict[str, Any]) -> bool:
+    '''
+    Business: Checks that a maintenance action comes from the scheduler, not a client
+    Args: event - HTTP event with X-Cron-Secret header
+    Returns: True when the header matches the CRON_SECRET environment variable
+    '''
+    secret = os.environ.get('CRON_SECRET', '')
+    headers = event.get('headers') or {}
+    provided = headers.get('X-Cron-Secret') or headers.get('x-cron-secret') or ''
+    return bool(secret) and hmac.compare_digest(provided, secret)
+
+def unread_badge(cur: Any, user_id: Any) -> int:
+    cur.execute("SELECT unread_count FROM notification_badges WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: User notifications generated from likes, comments, friend requests and messages
+    Args: event - HTTP event; context - request context
+    Returns: Notification pages, unread badge count, mark-read results
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Database configuration error'})
+        }
+    
+    pool = get_pool(database_url)
+    conn = pool.getconn()
+    try:
+        session_user_id = None if is_cron_request(event) else authenticate(event, conn)
+        with conn.cursor() as cur:
+            if method == 'POST':
+                body_data = json.loads(event.get('body', '{}'))
+                action = body_data.get('action', 'mark_read')
+                
+                if action == 'generate':
+                    if not is_cron_request(event):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Forbidden'})
+                        }
+                    
+                    deadline = time.monotonic() + GENERATE_TIME_BUDGET
+                    produced = {source: generate(conn, source, deadline) for source in SOURCE_QUERIES}
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'generated': produced})
+                    }
+                
+                if action == 'mark_read':
+                    user_id = session_user_id or body_data.get('user_id')
+                    notification_ids: Optional[List[Any]] = body_data.get('notification_ids')
+                    
+                    if not user_id:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'user_id is required'})
+                        }
+                    
+                    if notification_ids is not None and (not isinstance(notification_ids, list) or len(notification_ids) > MAX_MARK_READ_IDS):
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'notification_ids must be a list of at most %d ids' % MAX_MARK_READ_IDS})
+                        }
+                    
+                    condition = "AND id = ANY(%s::int[])" if notification_ids is not None else ""
+                    cur.execute("""
+                        WITH marked AS (
+                            UPDATE notifications
+                            SET is_read = true
+                            WHERE user_id = %s AND NOT is_read {}
+                            RETURNING id
+                        ),
+                        badge AS (
+                            UPDATE notification_badges
+                            SET unread_count = GREATEST(unread_count - (SELECT COUNT(*) FROM marked), 0)
+                            WHERE user_id = %s
+                            RETURNING unread_count
+                        )
+                        SELECT (SELECT COUNT(*) FROM marked), COALESCE((SELECT unread_count FROM badge), 0)
+                    """.format(condition),
+                        (user_id,) + ((notification_ids,) if notification_ids is not None else ()) + (user_id,))
+                    marked, unread_count = cur.fetchone()
+                    conn.commit()
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'marked': marked, 'unread_count': unread_count})
+                    }
+                
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Unknown action'})
+                }
+            
+            if method == 'GET':
+                params = event.get('queryStringParameters') or {}
+                user_id = session_user_id or params.get('user_id')
+                
+                if not user_id:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'user_id is required'})
+                    }
+                
+                if params.get('type') == 'badge':
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'unread_count': unread_badge(cur, user_id)})
+                    }
+                
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid limit or cursor'})
+                    }
+                
+                cursor_cond = "AND created_at <= %s AND (created_at, id) < (%s, %s)" if cursor else ""
+                cur.execute("""
+                    SELECT id, type, content, related_user_id, related_post_id, is_read, created_at, actor_count
+                    FROM notifications
+                    WHERE user_id = %s {}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """.format(cursor_cond),
+                    (user_id,) + ((cursor[0], cursor[0], cursor[1]) if cursor else ()) + (limit + 1,))
+                
+                notifications = cur.fetchall()
+                next_cursor = None
+                if len(notifications) > limit:
+                    notifications = notifications[:limit]
+                    next_cursor = encode_cursor(notifications[-1][6], notifications[-1][0])
+                
+                actors = profile_cache.get_many([n[3] for n in notifications], cur)
+                unread_count = unread_badge(cur, user_id)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'notifications': [{
+                            'id': n[0],
+                            'type': n[1],
+                            'content': describe(n[1], actors[n[3]], n[7]) if n[3] in actors and n[1] in TEXTS else n[2],
+                            'related_user_id': n[3],
+                            'related_post_id': n[4],
+                            'is_read': bool(n[5]),
+                            'created_at': n[6].isoformat() if n[6] else None,
+                            'actor_count': n[7],
+                            'username': actors[n[3]]['username'] if n[3] in actors else None,
+                            'avatar_url': actors[n[3]]['avatar_url'] if n[3] in actors else None
+                        } for n in notifications],
+                        'unread_count': unread_count,
+                        'next_cursor': next_cursor
+                    })
+                }
+    
+    except AuthError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
+    finally:
+        pool.putconn(conn)
+    
+    return {
+        'statusCode': 405,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': 'Method not allowed'})
+    }
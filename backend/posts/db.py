@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger('db.pool')
+if os.environ.get('LOG_LEVEL'):
+    logging.basicConfig()
+    logger.setLevel(os.environ['LOG_LEVEL'].upper())
+
+
+class PoolTimeout(Exception):
+    '''Raised when no connection could be borrowed within checkout_timeout'''
+
+
+class ConnectionPool:
+    '''
+    Business: Warm PostgreSQL connection pool that survives between invocations of a function instance
+    Args: dsn - database url; max_size - max open connections; max_idle - seconds an idle connection is kept;
+          health_check_after - idle seconds after which a connection is pinged before reuse;
+          checkout_timeout - seconds to wait for a free connection
+    '''
+
+    def __init__(self, dsn: str, max_size: int = 4, max_idle: float = 300.0,
+                 health_check_after: float = 30.0, checkout_timeout: float = 5.0):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._checkouts = 0
+        self._misses = 0
+        self._reconnects = 0
+        self._evictions = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _evict_expired(self, now: float) -> None:
+        fresh = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.max_idle or conn.closed:
+                self._evictions += 1
+                _close_quietly(conn)
+            else:
+                fresh.append((conn, last_used))
+        self._idle = fresh
+
+    def _is_healthy(self, conn: Any, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self) -> Any:
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        conn = None
+        last_used = 0.0
+        with self._cond:
+            while True:
+                self._evict_expired(time.monotonic())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout('No free database connection')
+                self._cond.wait(remaining)
+            self._in_use += 1
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                _close_quietly(conn)
+                conn = None
+                with self._cond:
+                    self._reconnects += 1
+            if conn is None:
+                conn = psycopg2.connect(self.dsn)
+                with self._cond:
+                    self._misses += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        waited = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn: Any, broken: bool = False) -> None:
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken or conn.closed or self._closed:
+                _close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('pool stats %s', json.dumps(self.stats()))
+
+    def closeall(self) -> None:
+        '''
+        Business: Closes idle connections and makes putconn close the ones still checked out
+        '''
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        '''
+        Business: Snapshot of pool size, checkouts, misses and checkout wait; logged at DEBUG on every putconn
+        Returns: Dict of counters since the instance started
+        '''
+        with self._cond:
+            return {
+                'size': len(self._idle) + self._in_use,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'misses': self._misses,
+                'reconnects': self._reconnects,
+                'evictions': self._evictions,
+                'wait_ms_avg': round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_ms_max': round(self._wait_max * 1000, 3)
+            }
+
+
+def _close_quietly(conn: Any) -> None:
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(dsn: str) -> ConnectionPool:
+    '''
+    Business: Returns the module-level pool, creating it on the first (cold) invocation
+    Args: dsn - database url from DATABASE_URL
+    Returns: Shared ConnectionPool for this function instance
+    '''
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.dsn != dsn:
+            if _pool is not None:
+                _pool.closeall()
+            _pool = ConnectionPool(
+                dsn,
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '4')),
+                max_idle=float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+                health_check_after=float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+                checkout_timeout=float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', '5'))
+            )
+        return _pool
@@ -1,7 +1,286 @@
+import base64
+import binascii
+import hmac
 import json
 import os
-import psycopg2
-from typing import Dict, Any
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from db import get_pool
+from likes_buffer import like_buffer
+from profiles import profile_cache
+from responses import fetch_dicts, json_response
+from session import AuthError, authenticate
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+RECONCILE_BATCH_SIZE = 1000
+RECONCILE_TIME_BUDGET = 20.0
+TIMELINE_LENGTH = 500
+FANOUT_LIMIT = 1000
+COMMENTS_PAGE_SIZE = 20
+MAX_LIKE_BATCH = 500
+HOT_POST_WEIGHT = 1.0
+HOT_LIKE_WEIGHT = 1.0
+HOT_COMMENT_WEIGHT = 3.0
+HOT_HALF_LIFE = 12 * 3600
+HOT_SCORE_FLOOR = 0.01
+
+TRIM_TIMELINES_QUERY = """
+    DELETE FROM home_timeline t
+    USING (
+        SELECT u.user_id, b.created_at, b.post_id
+        FROM unnest(%s::int[]) AS u(user_id)
+        CROSS JOIN LATERAL (
+            SELECT h.created_at, h.post_id
+            FROM home_timeline h
+            WHERE h.user_id = u.user_id
+            ORDER BY h.created_at DESC, h.post_id DESC
+            OFFSET {keep} LIMIT 1
+        ) b
+    ) cutoff
+    WHERE t.user_id = cutoff.user_id AND (t.created_at, t.post_id) <= (cutoff.created_at, cutoff.post_id)
+""".format(keep=TIMELINE_LENGTH)
+
+LIKE_QUERY = """
+    WITH ins AS (
+        INSERT INTO likes (user_id, post_id)
+        SELECT %(user_id)s, p.id FROM posts p WHERE p.id = %(post_id)s
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        RETURNING post_id
+    ),
+    upd AS (
+        UPDATE posts SET likes_count = likes_count + 1, hot_score = hot_score + {like_weight}
+        WHERE id IN (SELECT post_id FROM ins)
+        RETURNING likes_count
+    )
+    SELECT COALESCE((SELECT likes_count FROM upd), (SELECT likes_count FROM posts WHERE id = %(post_id)s)),
+           EXISTS (SELECT 1 FROM ins)
+""".format(like_weight=HOT_LIKE_WEIGHT)
+
+UNLIKE_QUERY = """
+    WITH del AS (
+        DELETE FROM likes
+        WHERE user_id = %(user_id)s AND post_id = %(post_id)s
+        RETURNING post_id
+    ),
+    upd AS (
+        UPDATE posts SET likes_count = GREATEST(likes_count - 1, 0), hot_score = GREATEST(hot_score - {like_weight}, 0)
+        WHERE id IN (SELECT post_id FROM del)
+        RETURNING likes_count
+    )
+    SELECT COALESCE((SELECT likes_count FROM upd), (SELECT likes_count FROM posts WHERE id = %(post_id)s)),
+           EXISTS (SELECT 1 FROM del)
+""".format(like_weight=HOT_LIKE_WEIGHT)
+
+SYNC_LIKES_QUERY = """
+    WITH wanted AS (
+        SELECT w.user_id, w.post_id, w.liked
+        FROM unnest(%(user_ids)s::int[], %(post_ids)s::int[], %(liked)s::bool[]) AS w(user_id, post_id, liked)
+        JOIN posts p ON p.id = w.post_id
+    ),
+    ins AS (
+        INSERT INTO likes (user_id, post_id)
+        SELECT user_id, post_id FROM wanted WHERE liked
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        RETURNING post_id
+    ),
+    del AS (
+        DELETE FROM likes l
+        USING wanted w
+        WHERE l.user_id = w.user_id AND l.post_id = w.post_id AND NOT w.liked
+        RETURNING l.post_id
+    ),
+    delta AS (
+        SELECT post_id, SUM(d) AS d
+        FROM (SELECT post_id, 1 AS d FROM ins UNION ALL SELECT post_id, -1 FROM del) changes
+        GROUP BY post_id
+    ),
+    upd AS (
+        UPDATE posts p
+        SET likes_count = GREATEST(p.likes_count + delta.d, 0),
+            hot_score = GREATEST(p.hot_score + delta.d * {like_weight}, 0)
+        FROM delta
+        WHERE p.id = delta.post_id
+        RETURNING p.id, p.likes_count
+    )
+    SELECT w.user_id, w.post_id, w.liked, COALESCE(u.likes_count, p.likes_count)
+    FROM wanted w
+    JOIN posts p ON p.id = w.post_id
+    LEFT JOIN upd u ON u.id = w.post_id
+""".format(like_weight=HOT_LIKE_WEIGHT)
+
+DECAY_HOT_SCORES_QUERY = """
+    WITH batch AS (
+        SELECT id FROM posts
+        WHERE id > %s AND hot_score > 0
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE
+    ),
+    decayed AS (
+        SELECT p.id, p.hot_score * power(0.5, LEAST(EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - p.hot_decayed_at)) / {half_life}, 60)) AS score
+        FROM posts p
+        JOIN batch b ON b.id = p.id
+    )
+    UPDATE posts p
+    SET hot_score = CASE WHEN d.score < {floor} THEN 0 ELSE d.score END,
+        hot_decayed_at = CURRENT_TIMESTAMP
+    FROM decayed d
+    WHERE p.id = d.id
+    RETURNING p.id
+""".format(half_life=HOT_HALF_LIFE, floor=HOT_SCORE_FLOOR)
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    '''
+    Business: Packs the (created_at, id) of the last row on a page into an opaque cursor
+    Args: created_at - post timestamp; post_id - post id
+    Returns: URL-safe cursor string
+    '''
+    raw = json.dumps([created_at.isoformat(), post_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    '''
+    Business: Unpacks a cursor produced by encode_cursor
+    Args: cursor - opaque cursor from a previous page
+    Returns: (created_at, id) keyset position; raises ValueError when malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, post_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def encode_hot_cursor(score: float, post_id: int) -> str:
+    '''
+    Business: Packs the (hot_score, id) of the last row on a hot page into an opaque cursor
+    Args: score - post hot score; post_id - post id
+    Returns: URL-safe cursor string
+    '''
+    raw = json.dumps([score, post_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_hot_cursor(cursor: str) -> Tuple[float, int]:
+    '''
+    Business: Unpacks a cursor produced by encode_hot_cursor
+    Args: cursor - opaque cursor from a previous hot page
+    Returns: (hot_score, id) keyset position; raises ValueError when malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, post_id = json.loads(raw)
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def fan_out_post(cur: Any, post_id: int, author_id: int, created_at: datetime) -> None:
+    '''
+    Business: Pushes a new post into the home timelines of its author and the author's friends
+    Args: cur - cursor inside the create_post transaction; post_id, author_id, created_at - the new post
+    Returns: None; authors with more than FANOUT_LIMIT friends are switched to pull mode instead.
+             Recipients' timelines are trimmed to TIMELINE_LENGTH in the same transaction
+    '''
+    cur.execute("SELECT friend_id FROM friends WHERE user_id = %s AND status = 'accepted'", (author_id,))
+    recipients = [r[0] for r in cur.fetchall()]
+    if len(recipients) > FANOUT_LIMIT:
+        cur.execute("UPDATE users SET pull_timeline = true WHERE id = %s AND NOT pull_timeline", (author_id,))
+        recipients = []
+    
+    cur.execute("""
+        INSERT INTO home_timeline (user_id, post_id, author_id, created_at)
+        SELECT r, %s, %s, %s FROM unnest(%s::int[]) AS r
+        ON CONFLICT (user_id, post_id) DO NOTHING
+    """, (post_id, author_id, created_at, recipients + [author_id]))
+    cur.execute(TRIM_TIMELINES_QUERY, (recipients + [author_id],))
+
+def fetch_comments(cur: Any, post_id: Any, cursor: Optional[Tuple[datetime, int]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''
+    Business: Loads one page of a post's comments, newest first, keyset by (created_at, id)
+    Args: cur - open cursor; post_id - post; cursor - position after the previous page or None; limit - page size
+    Returns: (comments with commenter username and avatar, next_cursor or None)
+    '''
+    cursor_cond = "AND c.created_at <= %s AND (c.created_at, c.id) < (%s, %s)" if cursor else ""
+    cur.execute("""
+        SELECT c.id, c.content, c.created_at, c.user_id
+        FROM comments c
+        WHERE c.post_id = %s {}
+        ORDER BY c.created_at DESC, c.id DESC
+        LIMIT %s
+    """.format(cursor_cond),
+        (post_id,) + ((cursor[0], cursor[0], cursor[1]) if cursor else ()) + (limit + 1,))
+    
+    comments = fetch_dicts(cur)
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1]['created_at'], comments[-1]['id'])
+    
+    commenters = profile_cache.get_many([c['user_id'] for c in comments], cur)
+    return [dict(c, username=commenters[c['user_id']]['username'], avatar_url=commenters[c['user_id']]['avatar_url'])
+            for c in comments if c['user_id'] in commenters], next_cursor
+
+def apply_likes(cur: Any, toggles: List[Tuple[int, int, bool]]) -> List[Tuple[int, int, bool, int]]:
+    '''
+    Business: Applies many (user_id, post_id, liked) toggles in one statement with one counter update per post
+    Args: cur - open cursor (caller commits); toggles - at most one toggle per (user, post)
+    Returns: (user_id, post_id, liked, likes_count) for toggles on existing posts; safe to replay
+    '''
+    cur.execute(SYNC_LIKES_QUERY, {
+        'user_ids': [t[0] for t in toggles],
+        'post_ids': [t[1] for t in toggles],
+        'liked': [t[2] for t in toggles]
+    })
+    return cur.fetchall()
+
+def viewer_likes(cur: Any, viewer_id: Any, post_ids: List[int]) -> Tuple[Set[int], Dict[int, int]]:
+    '''
+    Business: Finds which of the given posts the viewer has liked, in one indexed lookup
+    Args: cur - open cursor; viewer_id - viewing user or None; post_ids - posts on the page
+    Returns: (liked post ids, likes_count corrections for the viewer's own toggles still in the write-behind buffer)
+    '''
+    if not viewer_id or not post_ids:
+        return set(), {}
+    cur.execute("SELECT post_id FROM likes WHERE user_id = %s AND post_id = ANY(%s)", (viewer_id, post_ids))
+    stored = {r[0] for r in cur.fetchall()}
+    if not like_buffer:
+        return stored, {}
+    
+    liked = set(stored)
+    corrections = {}
+    for pid, queued in like_buffer.pending(int(viewer_id), post_ids).items():
+        if queued != (pid in stored):
+            corrections[pid] = 1 if queued else -1
+            if queued:
+                liked.add(pid)
+            else:
+                liked.discard(pid)
+    return liked, corrections
+
+def flush_like_buffer(conn: Any) -> int:
+    '''
+    Business: Drains one batch of buffered like toggles into likes and posts.likes_count
+    Args: conn - pooled connection; committed per batch
+    Returns: Number of buffered events applied
+    '''
+    def apply(toggles: List[Tuple[int, int, bool]]) -> None:
+        with conn.cursor() as cur:
+            apply_likes(cur, toggles)
+        conn.commit()
+    return like_buffer.flush(apply) if like_buffer else 0
+
+def is_cron_request(event: Dict[str, Any]) -> bool:
+    '''
+    Business: Checks that a maintenance action comes from the scheduler, not a client
+    Args: event - HTTP event with X-Cron-Secret header
+    Returns: True when the header matches the CRON_SECRET environment variable
+    '''
+    secret = os.environ.get('CRON_SECRET', '')
+    headers = event.get('headers') or {}
+    provided = headers.get('X-Cron-Secret') or headers.get('x-cron-secret') or ''
+    return bool(secret) and hmac.compare_digest(provided, secret)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -17,7 +296,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Auth-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,15 +311,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Database configuration error'})
         }
     
-    conn = psycopg2.connect(database_url)
+    pool = get_pool(database_url)
+    conn = pool.getconn()
     try:
+        session_user_id = None if is_cron_request(event) else authenticate(event, conn)
         with conn.cursor() as cur:
             if method == 'POST':
                 body_data = json.loads(event.get('body', '{}'))
                 action = body_data.get('action', 'create_post')
                 
                 if action == 'create_post':
-                    user_id = body_data.get('user_id')
+                    user_id = session_user_id or body_data.get('user_id')
                     content = body_data.get('content', '')
                     media_url = body_data.get('media_url', '')
                     media_type = body_data.get('media_type', '')
@@ -54,12 +335,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         }
                     
                     cur.execute("""
-                        INSERT INTO posts (user_id, content, media_url, media_type)
-                        VALUES (%s, %s, %s, %s)
+                        INSERT INTO posts (user_id, content, media_url, media_type, hot_score)
+                        VALUES (%s, %s, %s, %s, %s)
                         RETURNING id, user_id, content, media_url, media_type, created_at
-                    """, (user_id, content, media_url, media_type))
+                    """, (user_id, content, media_url, media_type, HOT_POST_WEIGHT))
                     
                     post = cur.fetchone()
+                    fan_out_post(cur, post[0], post[1], post[5])
                     conn.commit()
                     
                     return {
@@ -78,8 +360,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         })
                     }
                 
-                if action == 'like':
-                    user_id = body_data.get('user_id')
+                if action in ('like', 'unlike'):
+                    user_id = session_user_id or body_data.get('user_id')
                     post_id = body_data.get('post_id')
                     
                     if not user_id or not post_id:
@@ -90,48 +372,100 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'user_id and post_id are required'})
                         }
                     
-                    try:
-                        cur.execute("INSERT INTO likes (user_id, post_id) VALUES (%s, %s)", (user_id, post_id))
-                        conn.commit()
+                    if like_buffer:
+                        cur.execute("""
+                            SELECT p.likes_count, EXISTS (SELECT 1 FROM likes l WHERE l.user_id = %s AND l.post_id = p.id)
+                            FROM posts p
+                            WHERE p.id = %s
+                        """, (user_id, post_id))
+                        post = cur.fetchone()
+                        if not post:
+                            return {
+                                'statusCode': 404,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'Post not found'})
+                            }
+                        
+                        liked = action == 'like'
+                        queued = like_buffer.append(int(user_id), int(post_id), liked)
+                        before = post[1] if queued is None else queued
+                        if like_buffer.due():
+                            flush_like_buffer(conn)
+                        
                         return {
-                            'statusCode': 200,
+                            'statusCode': 202,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                             'isBase64Encoded': False,
-                            'body': json.dumps({'success': True})
+                            'body': json.dumps({
+                                'success': True,
+                                'liked': liked,
+                                'changed': before != liked,
+                                'likes_count': post[0] + int(liked) - int(post[1]),
+                                'buffered': True
+                            })
                         }
-                    except psycopg2.IntegrityError:
-                        conn.rollback()
+                    
+                    cur.execute(LIKE_QUERY if action == 'like' else UNLIKE_QUERY, {'user_id': user_id, 'post_id': post_id})
+                    likes_count, changed = cur.fetchone()
+                    conn.commit()
+                    
+                    if likes_count is None:
                         return {
-                            'statusCode': 409,
+                            'statusCode': 404,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                             'isBase64Encoded': False,
-                            'body': json.dumps({'error': 'Already liked'})
+                            'body': json.dumps({'error': 'Post not found'})
                         }
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'success': True,
+                            'liked': action == 'like',
+                            'changed': changed,
+                            'likes_count': likes_count
+                        })
+                    }
                 
-                if action == 'unlike':
-                    user_id = body_data.get('user_id')
-                    post_id = body_data.get('post_id')
+                if action == 'sync_likes':
+                    user_id = session_user_id or body_data.get('user_id')
+                    queued = body_data.get('likes') or []
                     
-                    if not user_id or not post_id:
+                    try:
+                        latest = {}
+                        for item in queued:
+                            post = int(item['post_id'])
+                            latest.pop(post, None)
+                            latest[post] = bool(item.get('liked', True))
+                    except (TypeError, ValueError, KeyError):
+                        latest = None
+                    
+                    if not user_id or not latest or len(latest) > MAX_LIKE_BATCH:
                         return {
                             'statusCode': 400,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                             'isBase64Encoded': False,
-                            'body': json.dumps({'error': 'user_id and post_id are required'})
+                            'body': json.dumps({'error': 'user_id and 1 to %d likes of {post_id, liked} are required' % MAX_LIKE_BATCH})
                         }
                     
-                    cur.execute("DELETE FROM likes WHERE user_id = %s AND post_id = %s", (user_id, post_id))
+                    rows = apply_likes(cur, [(int(user_id), pid, liked) for pid, liked in latest.items()])
                     conn.commit()
                     
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'isBase64Encoded': False,
-                        'body': json.dumps({'success': True})
+                        'body': json.dumps({
+                            'success': True,
+                            'likes': [{'post_id': r[1], 'liked': r[2], 'likes_count': r[3]} for r in rows]
+                        })
                     }
                 
                 if action == 'comment':
-                    user_id = body_data.get('user_id')
+                    user_id = session_user_id or body_data.get('user_id')
                     post_id = body_data.get('post_id')
                     content = body_data.get('content', '')
                     
@@ -150,6 +484,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     """, (user_id, post_id, content))
                     
                     comment = cur.fetchone()
+                    cur.execute("""
+                        UPDATE posts SET comments_count = comments_count + 1, hot_score = hot_score + %s
+                        WHERE id = %s
+                    """, (HOT_COMMENT_WEIGHT, post_id))
                     conn.commit()
                     
                     return {
@@ -165,27 +503,179 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         })
                     }
             
+                if action == 'reconcile_counters':
+                    if not is_cron_request(event):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Forbidden'})
+                        }
+                    
+                    after_id = int(body_data.get('after_id', 0))
+                    batch_size = min(max(int(body_data.get('batch_size', RECONCILE_BATCH_SIZE)), 1), 10000)
+                    fixed = 0
+                    deadline = time.monotonic() + RECONCILE_TIME_BUDGET
+                    done = False
+                    while time.monotonic() < deadline:
+                        cur.execute("""
+                            SELECT id FROM posts
+                            WHERE id > %s
+                            ORDER BY id
+                            LIMIT %s
+                            FOR UPDATE
+                        """, (after_id, batch_size))
+                        batch = [r[0] for r in cur.fetchall()]
+                        if not batch:
+                            conn.commit()
+                            done = True
+                            break
+                        
+                        cur.execute("""
+                            UPDATE posts p
+                            SET likes_count = a.likes, comments_count = a.comments
+                            FROM (
+                                SELECT b.id,
+                                       (SELECT COUNT(*) FROM likes l WHERE l.post_id = b.id) AS likes,
+                                       (SELECT COUNT(*) FROM comments c WHERE c.post_id = b.id) AS comments
+                                FROM unnest(%s::int[]) AS b(id)
+                            ) a
+                            WHERE p.id = a.id AND (p.likes_count <> a.likes OR p.comments_count <> a.comments)
+                        """, (batch,))
+                        fixed += cur.rowcount
+                        conn.commit()
+                        after_id = batch[-1]
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'fixed': fixed, 'next_after_id': None if done else after_id})
+                    }
+            
+                if action == 'decay_hot_scores':
+                    if not is_cron_request(event):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Forbidden'})
+                        }
+                    
+                    after_id = int(body_data.get('after_id', 0))
+                    batch_size = min(max(int(body_data.get('batch_size', RECONCILE_BATCH_SIZE)), 1), 10000)
+                    decayed = 0
+                    deadline = time.monotonic() + RECONCILE_TIME_BUDGET
+                    done = False
+                    while time.monotonic() < deadline:
+                        cur.execute(DECAY_HOT_SCORES_QUERY, (after_id, batch_size))
+                        batch = [r[0] for r in cur.fetchall()]
+                        conn.commit()
+                        if not batch:
+                            done = True
+                            break
+                        decayed += len(batch)
+                        after_id = max(batch)
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'decayed': decayed, 'next_after_id': None if done else after_id})
+                    }
+                
+                if action == 'flush_likes':
+                    if not is_cron_request(event):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Forbidden'})
+                        }
+                    
+                    flushed = 0
+                    deadline = time.monotonic() + RECONCILE_TIME_BUDGET
+                    while time.monotonic() < deadline:
+                        applied = flush_like_buffer(conn)
+                        if not applied:
+                            break
+                        flushed += applied
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'flushed': flushed})
+                    }
+                
+                if action == 'trim_timelines':
+                    if not is_cron_request(event):
+                        return {
+                            'statusCode': 403,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Forbidden'})
+                        }
+                    
+                    after_id = int(body_data.get('after_id', 0))
+                    batch_size = min(max(int(body_data.get('batch_size', RECONCILE_BATCH_SIZE)), 1), 10000)
+                    trimmed = 0
+                    deadline = time.monotonic() + RECONCILE_TIME_BUDGET
+                    done = False
+                    while time.monotonic() < deadline:
+                        cur.execute("SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s", (after_id, batch_size))
+                        batch = [r[0] for r in cur.fetchall()]
+                        if not batch:
+                            done = True
+                            break
+                        
+                        cur.execute(TRIM_TIMELINES_QUERY, (batch,))
+                        trimmed += cur.rowcount
+                        conn.commit()
+                        after_id = batch[-1]
+                    
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'success': True, 'trimmed': trimmed, 'next_after_id': None if done else after_id})
+                    }
+            
             if method == 'GET':
                 params = event.get('queryStringParameters', {})
                 user_id = params.get('user_id')
                 post_id = params.get('post_id')
+                viewer_id = session_user_id or params.get('viewer_id')
+                hot = params.get('sort') == 'hot' and not post_id and params.get('feed') != 'home'
+                
+                try:
+                    limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                    cursor_decoder = decode_hot_cursor if hot else decode_cursor
+                    cursor = cursor_decoder(params['cursor']) if params.get('cursor') else None
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid limit or cursor'})
+                    }
+                
+                if post_id and params.get('type') == 'comments':
+                    comments, next_cursor = fetch_comments(cur, post_id, cursor, limit)
+                    
+                    return json_response(event, 200, {'comments': comments, 'next_cursor': next_cursor}, etag=True)
                 
                 if post_id:
                     cur.execute("""
                         SELECT p.id, p.user_id, p.content, p.media_url, p.media_type, p.created_at,
-                               u.username, u.full_name, u.avatar_url,
-                               COUNT(DISTINCT l.id) as likes_count,
-                               COUNT(DISTINCT c.id) as comments_count
+                               p.likes_count, p.comments_count
                         FROM posts p
-                        JOIN users u ON p.user_id = u.id
-                        LEFT JOIN likes l ON p.id = l.post_id
-                        LEFT JOIN comments c ON p.id = c.post_id
                         WHERE p.id = %s
-                        GROUP BY p.id, u.id
                     """, (post_id,))
                     
-                    post = cur.fetchone()
-                    if not post:
+                    post = next(iter(fetch_dicts(cur)), None)
+                    author = profile_cache.get(post['user_id'], cur) if post else None
+                    if not author:
                         return {
                             'statusCode': 404,
                             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -193,79 +683,134 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'body': json.dumps({'error': 'Post not found'})
                         }
                     
+                    comments, comments_cursor = fetch_comments(cur, post_id, None, COMMENTS_PAGE_SIZE)
+                    liked, corrections = viewer_likes(cur, viewer_id, [post['id']])
+                    post.update(
+                        username=author['username'],
+                        full_name=author['full_name'],
+                        avatar_url=author['avatar_url'],
+                        likes_count=post['likes_count'] + corrections.get(post['id'], 0),
+                        liked_by_me=post['id'] in liked,
+                        comments=comments,
+                        comments_next_cursor=comments_cursor
+                    )
+                    
+                    return json_response(event, 200, post, etag=True)
+                
+                if params.get('feed') == 'home':
+                    viewer_id = viewer_id or user_id
+                    if not viewer_id:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'user_id is required for the home feed'})
+                        }
+                    
+                    timeline_cond = "AND (t.created_at, t.post_id) < (%s, %s)" if cursor else ""
+                    pull_cond = "AND p.created_at <= %s AND (p.created_at, p.id) < (%s, %s)" if cursor else ""
                     cur.execute("""
-                        SELECT c.id, c.content, c.created_at, u.username, u.avatar_url
-                        FROM comments c
-                        JOIN users u ON c.user_id = u.id
-                        WHERE c.post_id = %s
-                        ORDER BY c.created_at DESC
-                    """, (post_id,))
+                        SELECT post_id, created_at FROM (
+                            (SELECT t.post_id, t.created_at
+                             FROM home_timeline t
+                             WHERE t.user_id = %s {}
+                             ORDER BY t.created_at DESC, t.post_id DESC
+                             LIMIT %s)
+                            UNION
+                            (SELECT p.id, p.created_at
+                             FROM posts p
+                             WHERE p.user_id IN (
+                                 SELECT u.id FROM users u
+                                 WHERE u.pull_timeline AND u.id IN (
+                                     SELECT friend_id FROM friends WHERE user_id = %s AND status = 'accepted'
+                                 )
+                             ) {}
+                             ORDER BY p.created_at DESC, p.id DESC
+                             LIMIT %s)
+                        ) h
+                        ORDER BY created_at DESC, post_id DESC
+                        LIMIT %s
+                    """.format(timeline_cond, pull_cond),
+                        (viewer_id,) + (tuple(cursor) if cursor else ()) + (limit + 1,) +
+                        (viewer_id,) + ((cursor[0], cursor[0], cursor[1]) if cursor else ()) + (limit + 1,) +
+                        (limit + 1,))
                     
-                    comments = cur.fetchall()
+                    page = cur.fetchall()
+                    next_cursor = None
+                    if len(page) > limit:
+                        page = page[:limit]
+                        next_cursor = encode_cursor(page[-1][1], page[-1][0])
                     
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'isBase64Encoded': False,
-                        'body': json.dumps({
-                            'id': post[0],
-                            'user_id': post[1],
-                            'content': post[2],
-                            'media_url': post[3],
-                            'media_type': post[4],
-                            'created_at': post[5].isoformat() if post[5] else None,
-                            'username': post[6],
-                            'full_name': post[7],
-                            'avatar_url': post[8],
-                            'likes_count': post[9],
-                            'comments_count': post[10],
-                            'comments': [{
-                                'id': c[0],
-                                'content': c[1],
-                                'created_at': c[2].isoformat() if c[2] else None,
-                                'username': c[3],
-                                'avatar_url': c[4]
-                            } for c in comments]
-                        })
-                    }
-                
-                cur.execute("""
-                    SELECT p.id, p.user_id, p.content, p.media_url, p.media_type, p.created_at,
-                           u.username, u.full_name, u.avatar_url,
-                           COUNT(DISTINCT l.id) as likes_count,
-                           COUNT(DISTINCT c.id) as comments_count
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    LEFT JOIN likes l ON p.id = l.post_id
-                    LEFT JOIN comments c ON p.id = c.post_id
-                    {} 
-                    GROUP BY p.id, u.id
-                    ORDER BY p.created_at DESC
-                    LIMIT 50
-                """.format("WHERE p.user_id = %s" if user_id else ""), (user_id,) if user_id else ())
+                    cur.execute("""
+                        SELECT p.id, p.user_id, p.content, p.media_url, p.media_type, p.created_at,
+                               p.likes_count, p.comments_count
+                        FROM posts p
+                        WHERE p.id = ANY(%s)
+                    """, ([h[0] for h in page],))
+                    by_id = {r['id']: r for r in fetch_dicts(cur)}
+                    posts = [by_id[h[0]] for h in page if h[0] in by_id]
+                else:
+                    filters = []
+                    query_params = []
+                    if user_id:
+                        filters.append("p.user_id = %s")
+                        query_params.append(user_id)
+                    if cursor and hot:
+                        filters.append("p.hot_score <= %s AND (p.hot_score, p.id) < (%s, %s)")
+                        query_params.extend([cursor[0], cursor[0], cursor[1]])
+                    elif cursor:
+                        filters.append("p.created_at <= %s AND (p.created_at, p.id) < (%s, %s)")
+                        query_params.extend([cursor[0], cursor[0], cursor[1]])
+                    query_params.append(limit + 1)
+                    
+                    cur.execute("""
+                        SELECT p.id, p.user_id, p.content, p.media_url, p.media_type, p.created_at,
+                               p.likes_count, p.comments_count, p.hot_score
+                        FROM posts p
+                        {}
+                        ORDER BY {}
+                        LIMIT %s
+                    """.format(
+                        "WHERE " + " AND ".join(filters) if filters else "",
+                        "p.hot_score DESC, p.id DESC" if hot else "p.created_at DESC, p.id DESC"
+                    ), query_params)
+                    
+                    posts = fetch_dicts(cur)
+                    next_cursor = None
+                    if len(posts) > limit:
+                        posts = posts[:limit]
+                        if hot:
+                            next_cursor = encode_hot_cursor(posts[-1]['hot_score'], posts[-1]['id'])
+                        else:
+                            next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['id'])
                 
-                posts = cur.fetchall()
+                authors = profile_cache.get_many([p['user_id'] for p in posts], cur)
+                liked, corrections = viewer_likes(cur, viewer_id, [p['id'] for p in posts])
+                feed = []
+                for p in posts:
+                    author = authors.get(p['user_id'])
+                    if not author:
+                        continue
+                    p.pop('hot_score', None)
+                    p.update(
+                        username=author['username'],
+                        full_name=author['full_name'],
+                        avatar_url=author['avatar_url'],
+                        likes_count=p['likes_count'] + corrections.get(p['id'], 0),
+                        liked_by_me=p['id'] in liked
+                    )
+                    feed.append(p)
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps([{
-                        'id': p[0],
-                        'user_id': p[1],
-                        'content': p[2],
-                        'media_url': p[3],
-                        'media_type': p[4],
-                        'created_at': p[5].isoformat() if p[5] else None,
-                        'username': p[6],
-                        'full_name': p[7],
-                        'avatar_url': p[8],
-                        'likes_count': p[9],
-                        'comments_count': p[10]
-                    } for p in posts])
-                }
+                return json_response(event, 200, {'posts': feed, 'next_cursor': next_cursor}, etag=True)
+    except AuthError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
     finally:
-        conn.close()
+        pool.putconn(conn)
     
     return {
         'statusCode': 405,
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Toggle = Tuple[int, int, bool]
+
+
+class LikeBuffer:
+    '''
+    Business: Write-behind queue of like/unlike toggles in a local SQLite file shared by every process on the instance
+    Args: path - SQLite file; flush_size - queued events that make a flush due; flush_interval - seconds the oldest
+          event may wait; max_batch - events applied per flush; lease - seconds one process may hold the flush
+    '''
+
+    def __init__(self, path: str, flush_size: int = 500, flush_interval: float = 1.0,
+                 max_batch: int = 5000, lease: float = 30.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS like_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                post_id INTEGER NOT NULL,
+                liked INTEGER NOT NULL,
+                queued_at REAL NOT NULL
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS like_events_user_post ON like_events(user_id, post_id)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS flush_lease (id INTEGER PRIMARY KEY CHECK (id = 1), expires_at REAL NOT NULL)')
+        self._db.execute('INSERT OR IGNORE INTO flush_lease (id, expires_at) VALUES (1, 0)')
+
+    def append(self, user_id: int, post_id: int, liked: bool) -> Optional[bool]:
+        '''
+        Business: Durably queues one toggle; it is on disk when this returns
+        Args: user_id - acting user; post_id - post; liked - True for like, False for unlike
+        Returns: The user's previous queued state for the post, or None when nothing was queued
+        '''
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                prev = self._db.execute(
+                    'SELECT liked FROM like_events WHERE user_id = ? AND post_id = ? ORDER BY seq DESC LIMIT 1',
+                    (user_id, post_id)
+                ).fetchone()
+                self._db.execute(
+                    'INSERT INTO like_events (user_id, post_id, liked, queued_at) VALUES (?, ?, ?, ?)',
+                    (user_id, post_id, int(liked), time.time())
+                )
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return None if prev is None else bool(prev[0])
+
+    def pending(self, user_id: int, post_ids: Iterable[int]) -> Dict[int, bool]:
+        '''
+        Business: Latest queued state of the user's toggles, so their own reads see unflushed writes
+        Args: user_id - viewer; post_ids - posts on the page
+        Returns: Dict post id -> liked for posts with queued toggles
+        '''
+        post_ids = [int(p) for p in post_ids]
+        if not post_ids:
+            return {}
+        with self._lock:
+            rows = self._db.execute('''
+                SELECT post_id, liked FROM like_events
+                WHERE seq IN (
+                    SELECT MAX(seq) FROM like_events
+                    WHERE user_id = ? AND post_id IN (%s)
+                    GROUP BY post_id
+                )
+            ''' % ','.join('?' * len(post_ids)), [int(user_id)] + post_ids).fetchall()
+        return {r[0]: bool(r[1]) for r in rows}
+
+    def due(self) -> bool:
+        with self._lock:
+            count, oldest = self._db.execute('SELECT COUNT(*), MIN(queued_at) FROM like_events').fetchone()
+        return count >= self.flush_size or (count > 0 and time.time() - oldest >= self.flush_interval)
+
+    def flush(self, apply: Callable[[List[Toggle]], None]) -> int:
+        '''
+        Business: Drains one batch into the database, collapsing repeated toggles to the last one per (user, post)
+        Args: apply - writes and commits the toggles; replaying a batch after a crash must be harmless
+        Returns: Number of queued events drained, 0 when another process holds the flush lease
+        '''
+        now = time.time()
+        with self._lock:
+            acquired = self._db.execute(
+                'UPDATE flush_lease SET expires_at = ? WHERE id = 1 AND expires_at < ?', (now + self.lease, now)
+            ).rowcount
+        if not acquired:
+            return 0
+        try:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT seq, user_id, post_id, liked FROM like_events ORDER BY seq LIMIT ?', (self.max_batch,)
+                ).fetchall()
+            if not rows:
+                return 0
+            latest: Dict[Tuple[int, int], bool] = {}
+            for _, user_id, post_id, liked in rows:
+                latest[(user_id, post_id)] = bool(liked)
+            apply([(u, p, liked) for (u, p), liked in latest.items()])
+            with self._lock:
+                self._db.execute('DELETE FROM like_events WHERE seq <= ?', (rows[-1][0],))
+            return len(rows)
+        finally:
+            with self._lock:
+                self._db.execute('UPDATE flush_lease SET expires_at = 0 WHERE id = 1')
+
+
+like_buffer = LikeBuffer(
+    os.environ['LIKES_BUFFER_PATH'],
+    flush_size=int(os.environ.get('LIKES_BUFFER_FLUSH_SIZE', '500')),
+    flush_interval=float(os.environ.get('LIKES_BUFFER_FLUSH_INTERVAL', '1.0'))
+) if os.environ.get('LIKES_BUFFER_PATH') else None
@@ -0,0 +1,98 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, List, Set
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+BASE_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError('Object of type %s is not JSON serializable' % type(value).__name__)
+
+
+def dumps(payload: Any) -> bytes:
+    '''
+    Business: Serializes a payload to UTF-8 JSON, with orjson when installed and the stdlib otherwise
+    Args: payload - JSON-compatible data; datetimes are written in ISO 8601 like isoformat()
+    Returns: Encoded body
+    '''
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def fetch_dicts(cur: Any) -> List[Dict[str, Any]]:
+    '''
+    Business: Fetches the remaining rows of a cursor as dicts keyed by column name
+    Args: cur - cursor after execute(); use "AS" aliases to pick the keys
+    Returns: List of row dicts; datetimes stay datetimes and are formatted by dumps()
+    '''
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur.fetchall()]
+
+
+def _headers(event: Dict[str, Any]) -> Dict[str, str]:
+    return {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+
+
+def _accepted_encodings(header: str) -> Set[str]:
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def json_response(event: Dict[str, Any], status_code: int, payload: Any, etag: bool = False) -> Dict[str, Any]:
+    '''
+    Business: Builds a JSON response, compressed when the client accepts it, optionally revalidated by ETag
+    Args: event - HTTP event (Accept-Encoding, If-None-Match); status_code - HTTP status; payload - body data;
+          etag - tag the body and answer 304 when the client already has it
+    Returns: Function response dict; compressed bodies are base64 with isBase64Encoded set
+    '''
+    body = dumps(payload)
+    headers = dict(BASE_HEADERS)
+    request_headers = _headers(event)
+
+    if etag:
+        tag = 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        headers['ETag'] = tag
+        headers['Cache-Control'] = 'private, no-cache'
+        headers['Access-Control-Expose-Headers'] = 'ETag'
+        if_none_match = request_headers.get('if-none-match') or ''
+        if if_none_match.strip() == '*' or tag in [t.strip() for t in if_none_match.split(',')]:
+            return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        headers['Vary'] = 'Accept-Encoding'
+        accepted = _accepted_encodings(request_headers.get('accept-encoding') or '')
+        encoding = 'br' if brotli and 'br' in accepted else 'gzip' if 'gzip' in accepted else None
+        if encoding:
+            compressed = brotli.compress(body, quality=5) if encoding == 'br' else gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = encoding
+            return {
+                'statusCode': status_code,
+                'headers': headers,
+                'isBase64Encoded': True,
+                'body': base64.b64encode(compressed).decode('ascii')
+            }
+
+    return {'statusCode': status_code, 'headers': headers, 'isBase64Encoded': False, 'body': body.decode('utf-8')}
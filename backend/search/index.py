@@ -0,0 +1,219 @@
+import base64
+import binascii
+import json
+import os
+from typing import Dict, Any, Optional, Tuple
+
+from db import get_pool
+from profiles import profile_cache
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MIN_QUERY_LENGTH = 2
+SEARCH_CANDIDATES = 1000
+
+POSTS_SEARCH_QUERY = """
+    WITH q AS (
+        SELECT websearch_to_tsquery('russian', %(q)s) AS query
+    ),
+    candidates AS (
+        SELECT p.id, p.search_vector
+        FROM posts p, q
+        WHERE p.search_vector @@ q.query
+        ORDER BY p.id DESC
+        LIMIT %(candidates)s
+    ),
+    ranked AS (
+        SELECT c.id, ts_rank(c.search_vector, q.query) AS rank
+        FROM candidates c, q
+    ),
+    page AS (
+        SELECT id, rank
+        FROM ranked
+        WHERE %(after_score)s::real IS NULL OR (rank, id) < (%(after_score)s::real, %(after_id)s)
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    ),
+    capped AS (
+        SELECT COUNT(*) >= %(candidates)s AS truncated FROM candidates
+    )
+    SELECT p.id, p.user_id, p.created_at, p.likes_count, p.comments_count, page.rank,
+           ts_headline('russian', p.content, q.query, 'MaxFragments=2, MaxWords=20, MinWords=5'),
+           capped.truncated
+    FROM capped
+    CROSS JOIN q
+    LEFT JOIN (page JOIN posts p ON p.id = page.id) ON true
+    ORDER BY page.rank DESC, page.id DESC
+"""
+
+USERS_SEARCH_QUERY = """
+    SELECT id, score
+    FROM (
+        SELECT u.id,
+               GREATEST(
+                   similarity(u.username, %(q)s),
+                   similarity(COALESCE(u.full_name, ''), %(q)s),
+                   CASE WHEN lower(u.username) LIKE %(prefix)s THEN 1.0::real ELSE 0.0::real END
+               ) AS score
+        FROM users u
+        WHERE lower(u.username) LIKE %(prefix)s OR u.username %% %(q)s OR u.full_name %% %(q)s
+    ) s
+    WHERE %(after_score)s::real IS NULL OR (score, id) < (%(after_score)s::real, %(after_id)s)
+    ORDER BY score DESC, id DESC
+    LIMIT %(limit)s
+"""
+
+def encode_cursor(score: float, row_id: int) -> str:
+    '''
+    Business: Packs the (score, id) of the last result on a page into an opaque cursor
+    Args: score - rank or similarity of the row; row_id - post or user id
+    Returns: URL-safe cursor string
+    '''
+    raw = json.dumps([score, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    '''
+    Business: Unpacks a cursor produced by encode_cursor
+    Args: cursor - opaque cursor from a previous page
+    Returns: (score, id) keyset position; raises ValueError when malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, row_id = json.loads(raw)
+        return float(score), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+def like_prefix(query: str) -> str:
+    escaped = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Ranked full-text search over posts and fuzzy search over users
+    Args: event - HTTP event with q, type (posts|users), limit and cursor; context - request context
+    Returns: Page of results with highlight snippets and next_cursor; post results also carry truncated,
+             true when only the newest SEARCH_CANDIDATES matches were ranked
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Database configuration error'})
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    query = (params.get('q') or '').strip()
+    search_type = params.get('type', 'posts')
+    
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        cursor: Optional[Tuple[float, int]] = decode_cursor(params['cursor']) if params.get('cursor') else None
+    except (TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Invalid limit or cursor'})
+        }
+    
+    if len(query) < MIN_QUERY_LENGTH or search_type not in ('posts', 'users'):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'q of at least %d characters and type posts or users are required' % MIN_QUERY_LENGTH})
+        }
+    
+    query_params = {
+        'q': query,
+        'prefix': like_prefix(query),
+        'candidates': SEARCH_CANDIDATES,
+        'after_score': cursor[0] if cursor else None,
+        'after_id': cursor[1] if cursor else None,
+        'limit': limit + 1
+    }
+    
+    pool = get_pool(database_url)
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            if search_type == 'users':
+                cur.execute(USERS_SEARCH_QUERY, query_params)
+                rows = cur.fetchall()
+                next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+                rows = rows[:limit]
+                people = profile_cache.get_many([r[0] for r in rows], cur)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'results': [{
+                            'id': r[0],
+                            'username': people[r[0]]['username'],
+                            'full_name': people[r[0]]['full_name'],
+                            'avatar_url': people[r[0]]['avatar_url'],
+                            'score': r[1]
+                        } for r in rows if r[0] in people],
+                        'next_cursor': next_cursor
+                    })
+                }
+            
+            cur.execute(POSTS_SEARCH_QUERY, query_params)
+            rows = cur.fetchall()
+            truncated = bool(rows and rows[0][7])
+            rows = [r for r in rows if r[0] is not None]
+            next_cursor = encode_cursor(rows[limit - 1][5], rows[limit - 1][0]) if len(rows) > limit else None
+            rows = rows[:limit]
+            authors = profile_cache.get_many([r[1] for r in rows], cur)
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'results': [{
+                        'id': r[0],
+                        'user_id': r[1],
+                        'username': authors[r[1]]['username'],
+                        'full_name': authors[r[1]]['full_name'],
+                        'avatar_url': authors[r[1]]['avatar_url'],
+                        'created_at': r[2].isoformat() if r[2] else None,
+                        'likes_count': r[3],
+                        'comments_count': r[4],
+                        'rank': r[5],
+                        'snippet': r[6]
+                    } for r in rows if r[1] in authors],
+                    'next_cursor': next_cursor,
+                    'truncated': truncated
+                })
+            }
+    finally:
+        pool.putconn(conn)
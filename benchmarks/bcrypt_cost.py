@@ -0,0 +1,42 @@
+'''
+Microbenchmark: bcrypt hashes per second at each cost factor.
+Used to pick BCRYPT_ROUNDS and BCRYPT_WORKERS for the auth function.
+
+Usage: python benchmarks/bcrypt_cost.py [--min 8] [--max 14] [--workers 1,2,4]
+'''
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+def hashes_per_second(rounds: int, workers: int, duration: float) -> float:
+    salt = bcrypt.gensalt(rounds=rounds)
+    password = b'Benchmark1234'
+    done = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while time.perf_counter() - started < duration:
+            list(pool.map(lambda _: bcrypt.hashpw(password, salt), range(workers)))
+            done += workers
+    return done / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--min', type=int, default=8)
+    parser.add_argument('--max', type=int, default=14)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--duration', type=float, default=2.0)
+    args = parser.parse_args()
+
+    workers = [int(w) for w in args.workers.split(',')]
+    print('cost  ' + '  '.join('%10s' % ('%d worker(s)' % w) for w in workers))
+    for rounds in range(args.min, args.max + 1):
+        rates = [hashes_per_second(rounds, w, args.duration) for w in workers]
+        print('%4d  ' % rounds + '  '.join('%8.1f/s ' % r for r in rates))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+'''
+Benchmark: friend suggestions and mutual friends on a synthetic social graph.
+
+Seeds a preferential-attachment graph (a few hubs with thousands of friends, a long
+tail with a handful) into TEMP tables that shadow friends/friend_of_friend for this
+session only, then times the queries and the incremental update used by
+backend/friends against the naive self-join over friends.
+
+Usage: DATABASE_URL=... python benchmarks/friend_suggestions.py [--users 20000] [--edges-per-user 10]
+'''
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'friends'))
+import index as friends  # noqa: E402
+
+NAIVE_SUGGESTIONS = """
+    SELECT b.friend_id, COUNT(*) AS mutual_count
+    FROM friends a
+    JOIN friends b ON b.user_id = a.friend_id AND b.status = 'accepted'
+    WHERE a.user_id = %s AND a.status = 'accepted' AND b.friend_id <> a.user_id
+      AND NOT EXISTS (SELECT 1 FROM friends f WHERE f.user_id = a.user_id AND f.friend_id = b.friend_id)
+    GROUP BY b.friend_id
+    ORDER BY mutual_count DESC, b.friend_id
+    LIMIT %s
+"""
+
+
+def build_graph(users: int, m: int, seed: int) -> set:
+    rng = random.Random(seed)
+    targets = list(range(1, m + 1))
+    endpoints = []
+    edges = set()
+    for node in range(m + 1, users + 1):
+        for t in set(targets):
+            edges.add((min(node, t), max(node, t)))
+        endpoints.extend(targets)
+        endpoints.extend([node] * m)
+        targets = [rng.choice(endpoints) for _ in range(m)]
+    return edges
+
+
+def timed(cur, sql, params, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--edges-per-user', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TEMP TABLE friends (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            friend_id INTEGER NOT NULL,
+            status VARCHAR(20) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, friend_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE friend_of_friend (
+            user_id INTEGER NOT NULL,
+            candidate_id INTEGER NOT NULL,
+            mutual_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, candidate_id)
+        )
+    """)
+    cur.execute("CREATE INDEX ON friend_of_friend(user_id, mutual_count DESC, candidate_id)")
+
+    edges = build_graph(args.users, args.edges_per_user, args.seed)
+    buf = io.StringIO()
+    for a, b in edges:
+        buf.write('%d\t%d\taccepted\n%d\t%d\taccepted\n' % (a, b, b, a))
+    buf.seek(0)
+    started = time.perf_counter()
+    cur.copy_from(buf, 'friends', columns=('user_id', 'friend_id', 'status'))
+    cur.execute("""
+        INSERT INTO friend_of_friend (user_id, candidate_id, mutual_count)
+        SELECT a.user_id, b.friend_id, COUNT(*)
+        FROM friends a
+        JOIN friends b ON b.user_id = a.friend_id
+        WHERE a.status = 'accepted' AND b.status = 'accepted' AND b.friend_id <> a.user_id
+        GROUP BY a.user_id, b.friend_id
+    """)
+    cur.execute("ANALYZE friends")
+    cur.execute("ANALYZE friend_of_friend")
+    print('seeded %d users, %d friendships, friend_of_friend backfill in %.1fs'
+          % (args.users, len(edges), time.perf_counter() - started))
+
+    cur.execute("SELECT user_id, COUNT(*) FROM friends GROUP BY user_id ORDER BY COUNT(*) DESC")
+    degrees = cur.fetchall()
+    hub, hub_degree = degrees[0]
+    typical, typical_degree = degrees[len(degrees) // 2]
+    other_hub = degrees[1][0]
+
+    print('%-34s %12s %12s' % ('', 'hub (%d)' % hub_degree, 'median (%d)' % typical_degree))
+    for label, sql, params in (
+        ('suggestions, friend_of_friend', friends.SUGGESTIONS_QUERY, lambda u: (u, 20)),
+        ('suggestions, naive self-join', NAIVE_SUGGESTIONS, lambda u: (u, 20)),
+        ('mutual friends with 2nd hub', friends.MUTUAL_FRIENDS_QUERY, lambda u: (other_hub, u, 0, 51)),
+    ):
+        print('%-34s %10.2fms %10.2fms' % (
+            label, timed(cur, sql, params(hub), args.runs), timed(cur, sql, params(typical), args.runs)))
+
+    stranger = degrees[-1][0]
+    samples = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        friends.update_friend_of_friend(cur, hub, stranger, 1)
+        friends.update_friend_of_friend(cur, hub, stranger, -1)
+        samples.append((time.perf_counter() - started) * 1000 / 2)
+    print('%-34s %10.2fms' % ('incremental update on hub accept', statistics.median(samples)))
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+'''
+Benchmark: like throughput with direct writes versus the write-behind buffer.
+
+Replays a burst of like/unlike toggles skewed towards a few viral posts against TEMP
+tables that shadow posts/likes for this session only. Direct mode runs LIKE_QUERY or
+UNLIKE_QUERY and commits per event, as the posts function does without
+LIKES_BUFFER_PATH. Buffered mode appends to a LikeBuffer file and flushes through
+apply_likes whenever the buffer is due. Both modes must end with identical likes and
+counters.
+
+Usage: DATABASE_URL=... python benchmarks/likes_write_behind.py [--events 20000] [--users 5000] [--posts 200]
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'posts'))
+import index as posts  # noqa: E402
+from likes_buffer import LikeBuffer  # noqa: E402
+
+
+def make_events(count: int, users: int, post_count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** 1.2 for rank in range(post_count)]
+    post_ids = rng.choices(range(1, post_count + 1), weights=weights, k=count)
+    return [(rng.randint(1, users), pid, rng.random() < 0.8) for pid in post_ids]
+
+
+def reset(cur) -> None:
+    cur.execute("TRUNCATE likes")
+    cur.execute("UPDATE posts SET likes_count = 0")
+    cur.connection.commit()
+
+
+def snapshot(cur) -> tuple:
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(likes_count), 0) FROM posts")
+    posts_state = cur.fetchone()
+    cur.execute("SELECT COUNT(*) FROM likes")
+    return posts_state + cur.fetchone()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--flush-size', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TEMP TABLE posts (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            likes_count INTEGER NOT NULL DEFAULT 0,
+            hot_score DOUBLE PRECISION NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE likes (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            post_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, post_id)
+        )
+    """)
+    cur.execute("INSERT INTO posts (user_id, content) SELECT 1, 'post ' || g FROM generate_series(1, %s) g",
+                (args.posts,))
+    conn.commit()
+    events = make_events(args.events, args.users, args.posts, args.seed)
+
+    reset(cur)
+    started = time.perf_counter()
+    for user_id, post_id, liked in events:
+        cur.execute(posts.LIKE_QUERY if liked else posts.UNLIKE_QUERY, {'user_id': user_id, 'post_id': post_id})
+        cur.fetchone()
+        conn.commit()
+    direct = time.perf_counter() - started
+    direct_state = snapshot(cur)
+
+    def apply(toggles):
+        posts.apply_likes(cur, toggles)
+        conn.commit()
+
+    reset(cur)
+    with tempfile.TemporaryDirectory() as tmp:
+        buffer = LikeBuffer(os.path.join(tmp, 'likes.db'), flush_size=args.flush_size)
+        started = time.perf_counter()
+        for user_id, post_id, liked in events:
+            buffer.append(user_id, post_id, liked)
+            if buffer.due():
+                buffer.flush(apply)
+        while buffer.flush(apply):
+            pass
+        buffered = time.perf_counter() - started
+    buffered_state = snapshot(cur)
+
+    print('%d toggles on %d posts by %d users' % (args.events, args.posts, args.users))
+    print('%-28s %10.0f events/s' % ('direct, commit per event', args.events / direct))
+    print('%-28s %10.0f events/s' % ('write-behind, flush %d' % args.flush_size, args.events / buffered))
+    print('final state (posts, sum likes_count, likes rows): direct %s, buffered %s%s' % (
+        direct_state, buffered_state, '' if direct_state == buffered_state else '  MISMATCH'))
+
+    cur.execute("DROP TABLE likes")
+    cur.execute("DROP TABLE posts")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+Benchmark: post full-text search and user fuzzy search on a seeded dataset.
+
+Seeds N posts of random Russian text and M users into TEMP tables that shadow
+posts/users for this session only, builds the same indexes as V0013 and times the
+queries used by backend/search. The target is p95 under 50 ms at one million posts.
+
+Usage: DATABASE_URL=... python benchmarks/search.py [--posts 1000000] [--users 100000]
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'search'))
+import index as search  # noqa: E402
+
+WORDS = (
+    'музыка концерт вечер друзья город море солнце книга фильм история работа учёба '
+    'праздник дорога поездка фотография школа университет лето зима осень весна песня '
+    'гитара выставка театр кофе завтрак прогулка парк река лес горы спорт футбол бег '
+    'новости мечта любовь семья радость встреча путешествие проект идея искусство'
+).split()
+
+QUERIES = ('музыка', 'концерты', 'летний вечер', 'поездки на море', 'театр -кино', 'горы зимой')
+USER_QUERIES = ('ivan', 'ivna', 'petr', 'masha_1', 'alex')
+
+
+def timed(cur, sql, params, runs: int):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cur.execute("SELECT setseed(0.42)")
+    cur.execute("""
+        CREATE TEMP TABLE posts (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            likes_count INTEGER NOT NULL DEFAULT 0,
+            comments_count INTEGER NOT NULL DEFAULT 0,
+            search_vector tsvector GENERATED ALWAYS AS (to_tsvector('russian', COALESCE(content, ''))) STORED
+        )
+    """)
+    cur.execute("""
+        CREATE TEMP TABLE users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) NOT NULL,
+            full_name VARCHAR(100)
+        )
+    """)
+
+    started = time.perf_counter()
+    cur.execute("""
+        INSERT INTO posts (user_id, content, created_at)
+        SELECT 1 + (random() * %s)::int,
+               (SELECT string_agg(w[1 + (random() * (array_length(w, 1) - 1))::int], ' ')
+                FROM generate_series(1, 8 + (g %% 25))),
+               now() - (random() * interval '365 days')
+        FROM generate_series(1, %s) AS g, (SELECT %s::text[] AS w) words
+    """, (args.users - 1, args.posts, list(WORDS)))
+    cur.execute("""
+        INSERT INTO users (username, full_name)
+        SELECT (ARRAY['ivan', 'petr', 'masha', 'alex', 'olga', 'dima'])[1 + g %% 6] || '_' || g,
+               (ARRAY['Иван', 'Пётр', 'Мария', 'Алексей', 'Ольга', 'Дмитрий'])[1 + g %% 6] || ' ' ||
+               (ARRAY['Иванов', 'Петров', 'Смирнова', 'Кузнецов', 'Попова'])[1 + g %% 5]
+        FROM generate_series(1, %s) AS g
+    """, (args.users,))
+    cur.execute("CREATE INDEX ON posts USING GIN (search_vector)")
+    cur.execute("CREATE INDEX ON users USING GIN (username gin_trgm_ops)")
+    cur.execute("CREATE INDEX ON users USING GIN (full_name gin_trgm_ops)")
+    cur.execute("CREATE INDEX ON users (lower(username) text_pattern_ops)")
+    cur.execute("ANALYZE posts")
+    cur.execute("ANALYZE users")
+    print('seeded %d posts and %d users in %.1fs' % (args.posts, args.users, time.perf_counter() - started))
+
+    print('%-28s %10s %10s' % ('query', 'p50', 'p95'))
+    for q in QUERIES:
+        params = {'q': q, 'candidates': search.SEARCH_CANDIDATES, 'after_score': None, 'after_id': None, 'limit': 21}
+        p50, p95 = timed(cur, search.POSTS_SEARCH_QUERY, params, args.runs)
+        print('%-28s %8.2fms %8.2fms' % ('posts: ' + q, p50, p95))
+    for q in USER_QUERIES:
+        params = {'q': q, 'prefix': search.like_prefix(q), 'after_score': None, 'after_id': None, 'limit': 21}
+        p50, p95 = timed(cur, search.USERS_SEARCH_QUERY, params, args.runs)
+        print('%-28s %8.2fms %8.2fms' % ('users: ' + q, p50, p95))
+
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+-- Restore denormalized engagement counters on posts (dropped in V0005)
+ALTER TABLE posts
+  ADD COLUMN IF NOT EXISTS likes_count INTEGER NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS comments_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from existing likes and comments
+UPDATE posts p
+SET likes_count = l.cnt
+FROM (SELECT post_id, COUNT(*) AS cnt FROM likes GROUP BY post_id) l
+WHERE l.post_id = p.id;
+
+UPDATE posts p
+SET comments_count = c.cnt
+FROM (SELECT post_id, COUNT(*) AS cnt FROM comments GROUP BY post_id) c
+WHERE c.post_id = p.id;
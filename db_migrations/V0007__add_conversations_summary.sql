@@ -0,0 +1,36 @@
+-- One row per participant of a dialog: inbox reads become a range scan on (user_id, last_message_at)
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id INTEGER NOT NULL,
+    other_user_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    last_sender_id INTEGER NOT NULL,
+    last_message_preview VARCHAR(200) NOT NULL,
+    last_message_at TIMESTAMP NOT NULL,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, other_user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_user_last_message ON conversations(user_id, last_message_at DESC);
+
+-- Backfill from existing messages
+WITH sides AS (
+    SELECT sender_id AS user_id, receiver_id AS other_user_id, id, sender_id, content, created_at FROM messages
+    UNION ALL
+    SELECT receiver_id, sender_id, id, sender_id, content, created_at FROM messages
+),
+latest AS (
+    SELECT DISTINCT ON (user_id, other_user_id) user_id, other_user_id, id, sender_id, content, created_at
+    FROM sides
+    ORDER BY user_id, other_user_id, created_at DESC, id DESC
+),
+unread AS (
+    SELECT receiver_id, sender_id, COUNT(*) AS cnt
+    FROM messages
+    WHERE is_read = false
+    GROUP BY receiver_id, sender_id
+)
+INSERT INTO conversations (user_id, other_user_id, last_message_id, last_sender_id, last_message_preview, last_message_at, unread_count)
+SELECT l.user_id, l.other_user_id, l.id, l.sender_id, LEFT(l.content, 200), COALESCE(l.created_at, CURRENT_TIMESTAMP), COALESCE(u.cnt, 0)
+FROM latest l
+LEFT JOIN unread u ON u.receiver_id = l.user_id AND u.sender_id = l.other_user_id
+ON CONFLICT (user_id, other_user_id) DO NOTHING;
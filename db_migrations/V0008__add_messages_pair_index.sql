@@ -0,0 +1,2 @@
+-- Chat history is read per direction of a dialog in (created_at, id) order
+CREATE INDEX IF NOT EXISTS idx_messages_pair_created_at ON messages(sender_id, receiver_id, created_at, id);
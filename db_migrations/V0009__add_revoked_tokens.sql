@@ -0,0 +1,9 @@
+-- Deny-list for revoked session tokens; rows are useless after expires_at
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
@@ -0,0 +1,31 @@
+-- Precomputed home timelines: post ids pushed to the author's friends on create
+CREATE TABLE IF NOT EXISTS home_timeline (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, post_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_home_timeline_user_created ON home_timeline(user_id, created_at DESC, post_id DESC);
+
+-- Authors with too many friends are not fanned out; readers pull their posts instead
+ALTER TABLE users ADD COLUMN IF NOT EXISTS pull_timeline BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Backfill the latest 500 entries of every timeline from own and friends' posts
+INSERT INTO home_timeline (user_id, post_id, author_id, created_at)
+SELECT user_id, post_id, author_id, created_at
+FROM (
+    SELECT r.user_id, p.id AS post_id, p.user_id AS author_id, COALESCE(p.created_at, CURRENT_TIMESTAMP) AS created_at,
+           ROW_NUMBER() OVER (PARTITION BY r.user_id ORDER BY p.created_at DESC, p.id DESC) AS rn
+    FROM (
+        SELECT user_id, friend_id AS author_id FROM friends WHERE status = 'accepted'
+        UNION
+        SELECT friend_id, user_id FROM friends WHERE status = 'accepted'
+        UNION
+        SELECT id, id FROM users
+    ) r
+    JOIN posts p ON p.user_id = r.author_id
+) ranked
+WHERE rn <= 500
+ON CONFLICT (user_id, post_id) DO NOTHING;
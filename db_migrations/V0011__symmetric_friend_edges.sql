@@ -0,0 +1,23 @@
+-- Accepted friendships are stored as two directed rows (user_id -> friend_id and back);
+-- a pending request is a single row from the requester
+
+-- A pending request opposite an accepted edge is already resolved
+UPDATE friends f
+SET status = 'accepted'
+FROM friends r
+WHERE r.user_id = f.friend_id AND r.friend_id = f.user_id
+  AND r.status = 'accepted' AND f.status <> 'accepted';
+
+-- Add the missing reverse edge of every accepted friendship
+INSERT INTO friends (user_id, friend_id, status, created_at)
+SELECT friend_id, user_id, 'accepted', created_at
+FROM friends
+WHERE status = 'accepted'
+ON CONFLICT (user_id, friend_id) DO NOTHING;
+
+DELETE FROM friends WHERE user_id = friend_id;
+
+ALTER TABLE friends ADD CONSTRAINT chk_friends_not_self CHECK (user_id <> friend_id);
+
+-- Incoming pending requests are looked up by recipient
+CREATE INDEX IF NOT EXISTS idx_friends_friend_id_status ON friends(friend_id, status);
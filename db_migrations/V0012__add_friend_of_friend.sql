@@ -0,0 +1,18 @@
+-- Number of mutual friends for every pair of users that share at least one friend.
+-- Maintained incrementally by the friends function on accept/remove.
+CREATE TABLE IF NOT EXISTS friend_of_friend (
+    user_id INTEGER NOT NULL,
+    candidate_id INTEGER NOT NULL,
+    mutual_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, candidate_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_friend_of_friend_rank ON friend_of_friend(user_id, mutual_count DESC, candidate_id);
+
+INSERT INTO friend_of_friend (user_id, candidate_id, mutual_count)
+SELECT a.user_id, b.friend_id, COUNT(*)
+FROM friends a
+JOIN friends b ON b.user_id = a.friend_id
+WHERE a.status = 'accepted' AND b.status = 'accepted' AND b.friend_id <> a.user_id
+GROUP BY a.user_id, b.friend_id
+ON CONFLICT (user_id, candidate_id) DO NOTHING;
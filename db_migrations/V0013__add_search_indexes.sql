@@ -0,0 +1,12 @@
+-- Full-text search over posts (Russian stemming) and fuzzy search over user names
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE posts
+  ADD COLUMN IF NOT EXISTS search_vector tsvector
+  GENERATED ALWAYS AS (to_tsvector('russian', COALESCE(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_posts_search_vector ON posts USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING GIN (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm ON users USING GIN (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix ON users (lower(username) text_pattern_ops);
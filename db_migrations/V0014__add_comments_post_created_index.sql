@@ -0,0 +1,5 @@
+-- Comments are read one page at a time per post, newest first, keyset by (created_at, id).
+-- The composite index serves those pages and every lookup the bare post_id index did.
+CREATE INDEX IF NOT EXISTS idx_comments_post_created ON comments(post_id, created_at, id);
+
+DROP INDEX IF EXISTS idx_comments_post_id;
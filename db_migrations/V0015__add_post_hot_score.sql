@@ -0,0 +1,16 @@
+-- Time-decayed engagement score for the hot feed (GET ?sort=hot).
+-- Incremented on like/comment by the posts function and periodically multiplied
+-- down by the decay_hot_scores cron action; hot_decayed_at is when it was last decayed.
+ALTER TABLE posts
+  ADD COLUMN IF NOT EXISTS hot_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS hot_decayed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- Backfill from the counters; weights and the 12h half-life match HOT_* in backend/posts/index.py
+UPDATE posts
+SET hot_score = (1 + likes_count + 3 * comments_count)
+                * power(0.5, LEAST(EXTRACT(EPOCH FROM (LOCALTIMESTAMP - created_at)) / 43200, 60))
+WHERE created_at IS NOT NULL;
+
+UPDATE posts SET hot_score = 0 WHERE hot_score < 0.01;
+
+CREATE INDEX IF NOT EXISTS idx_posts_hot ON posts(hot_score DESC, id DESC);
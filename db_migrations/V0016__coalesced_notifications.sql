@@ -0,0 +1,32 @@
+-- Notifications are generated asynchronously by the notifications function from likes,
+-- comments, friends and messages, and bursts fold into one unread row per group
+-- (e.g. every like on a post): group_key names the group, actor_count how many events it holds.
+ALTER TABLE notifications
+  ADD COLUMN IF NOT EXISTS group_key VARCHAR(100),
+  ADD COLUMN IF NOT EXISTS actor_count INTEGER NOT NULL DEFAULT 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_unread_group ON notifications(user_id, group_key) WHERE NOT is_read;
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at DESC, id DESC);
+
+-- Unread badge per user, kept in step with notifications so the count is a primary key lookup
+CREATE TABLE IF NOT EXISTS notification_badges (
+    user_id INTEGER PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO notification_badges (user_id, unread_count)
+SELECT user_id, COUNT(*) FROM notifications WHERE NOT is_read GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
+-- Last source row turned into notifications; generation starts from now, history is not replayed
+CREATE TABLE IF NOT EXISTS notification_sources (
+    source VARCHAR(20) PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+
+INSERT INTO notification_sources (source, last_id)
+SELECT 'likes', COALESCE(MAX(id), 0) FROM likes
+UNION ALL SELECT 'comments', COALESCE(MAX(id), 0) FROM comments
+UNION ALL SELECT 'friends', COALESCE(MAX(id), 0) FROM friends
+UNION ALL SELECT 'messages', COALESCE(MAX(id), 0) FROM messages
+ON CONFLICT (source) DO NOTHING;
@@ -0,0 +1,20 @@
+-- Playlist tracks are read in position order; positions are spaced 1024 apart
+-- (POSITION_GAP in backend/music/index.py) so a move only rewrites the moved row.
+ALTER TABLE playlists ADD COLUMN IF NOT EXISTS track_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE playlists p
+SET track_count = t.cnt
+FROM (SELECT playlist_id, COUNT(*) AS cnt FROM tracks GROUP BY playlist_id) t
+WHERE t.playlist_id = p.id;
+
+UPDATE tracks t
+SET position = r.rn * 1024
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY playlist_id ORDER BY position, id) AS rn
+    FROM tracks
+) r
+WHERE t.id = r.id;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_playlist_position ON tracks(playlist_id, position, id);
+
+DROP INDEX IF EXISTS idx_tracks_playlist_id;
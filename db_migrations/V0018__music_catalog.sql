@@ -0,0 +1,44 @@
+-- One catalog row per external track; music keeps only per-user saves pointing at it.
+-- save_count is maintained by the music function on save/delete.
+CREATE TABLE IF NOT EXISTS music_catalog (
+    id SERIAL PRIMARY KEY,
+    platform VARCHAR(20) NOT NULL,
+    external_id VARCHAR(255) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    artist VARCHAR(255),
+    thumbnail_url TEXT,
+    url TEXT NOT NULL,
+    save_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(platform, external_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_music_catalog_popular ON music_catalog(save_count DESC, id DESC);
+
+-- Dedup: metadata of the first save of each track wins
+INSERT INTO music_catalog (platform, external_id, title, artist, thumbnail_url, url, created_at)
+SELECT DISTINCT ON (platform, external_id) platform, external_id, title, artist, thumbnail_url, url, created_at
+FROM music
+ORDER BY platform, external_id, created_at, id
+ON CONFLICT (platform, external_id) DO NOTHING;
+
+ALTER TABLE music ADD COLUMN IF NOT EXISTS track_id INTEGER;
+
+UPDATE music m
+SET track_id = c.id
+FROM music_catalog c
+WHERE c.platform = m.platform AND c.external_id = m.external_id AND m.track_id IS NULL;
+
+UPDATE music_catalog c
+SET save_count = s.cnt
+FROM (SELECT track_id, COUNT(*) AS cnt FROM music GROUP BY track_id) s
+WHERE s.track_id = c.id;
+
+ALTER TABLE music ALTER COLUMN track_id SET NOT NULL;
+
+ALTER TABLE music
+  DROP COLUMN IF EXISTS external_id,
+  DROP COLUMN IF EXISTS title,
+  DROP COLUMN IF EXISTS artist,
+  DROP COLUMN IF EXISTS thumbnail_url,
+  DROP COLUMN IF EXISTS url;
@@ -0,0 +1,23 @@
+-- A user saves each catalog track at most once; keep the earliest of any duplicate saves
+DELETE FROM music m
+USING music d
+WHERE m.user_id = d.user_id AND m.track_id = d.track_id AND m.id > d.id;
+
+UPDATE music_catalog c
+SET save_count = s.cnt
+FROM (
+    SELECT c2.id, COUNT(m.id) AS cnt
+    FROM music_catalog c2
+    LEFT JOIN music m ON m.track_id = c2.id
+    GROUP BY c2.id
+) s
+WHERE s.id = c.id AND c.save_count <> s.cnt;
+
+-- track_id stands for (platform, external_id), so this is the per-user duplicate-save guard
+CREATE UNIQUE INDEX IF NOT EXISTS idx_music_user_track ON music(user_id, track_id);
+
+-- Keyset pages of a library, with and without the platform filter
+CREATE INDEX IF NOT EXISTS idx_music_user_platform_created ON music(user_id, platform, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_music_user_created ON music(user_id, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_music_user_id;
@@ -14,6 +14,7 @@ const API_POSTS = 'https://functions.poehali.dev/198e8691-66af-4852-af3d-c006a6a
 const API_COMMUNITIES = 'https://functions.poehali.dev/8eafc739-e45c-4a2b-9aaf-759dfd6bdf28';
 const API_FRIENDS = 'https://functions.poehali.dev/a76e8452-6446-4f93-80d8-e9b58b73d1f3';
 const API_NOTIFICATIONS = 'https://functions.poehali.dev/ce61306a-ca64-4d83-8581-a10ab369b2d6';
+const API_MUSIC = 'https://functions.poehali.dev/52775cde-f333-433a-b6a5-4a371fcb4e55';
 
 const Index = () => {
   const [activeSection, setActiveSection] = useState('feed');
@@ -451,7 +452,7 @@ const Index = () => {
   const loadPlaylists = async () => {
     if (!user) return;
     try {
-      const response = await fetch(`${API_POSTS}?user_id=${user.id}&type=playlists`);
+      const response = await fetch(`${API_MUSIC}?user_id=${user.id}&type=playlists`);
       const data = await response.json();
       setPlaylists(data.playlists || []);
     } catch (error) {
@@ -463,7 +464,7 @@ const Index = () => {
     if (!user || !newPlaylistName) return;
     
     try {
-      const response = await fetch(API_POSTS, {
+      const response = await fetch(API_MUSIC, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({